@@ -31,6 +31,7 @@ class ShopAdmin(admin.ModelAdmin):
     list_filter = ('state',)
     search_fields = ('name', 'user__email')
     list_select_related = ('user',)
+    readonly_fields = ('url_etag', 'url_last_modified', 'feed_digest', 'catalog_version')
 
 
 @admin.register(Category)
@@ -49,21 +50,21 @@ class ProductAdmin(admin.ModelAdmin):
 
 @admin.register(ProductInfo)
 class ProductInfoAdmin(admin.ModelAdmin):
-    list_display = ('id', 'product', 'shop', 'external_id', 'price', 'quantity', 'price_rrc')
-    list_filter = ('shop',)
+    list_display = ('id', 'product', 'shop', 'external_id', 'price', 'quantity', 'price_rrc', 'is_active')
+    list_filter = ('shop', 'is_active')
     search_fields = ('product__name', 'shop__name', 'external_id')
     list_select_related = ('product', 'shop')
 
 
 @admin.register(Parameter)
 class ParameterAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name')
+    list_display = ('id', 'name', 'unit')
     search_fields = ('name',)
 
 
 @admin.register(ProductParameter)
 class ProductParameterAdmin(admin.ModelAdmin):
-    list_display = ('id', 'product_info', 'parameter', 'value')
+    list_display = ('id', 'product_info', 'parameter', 'value', 'value_number')
     list_filter = ('parameter',)
     search_fields = ('product_info__product__name', 'parameter__name', 'value')
     list_select_related = ('product_info', 'parameter')
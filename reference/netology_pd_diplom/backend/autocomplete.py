@@ -0,0 +1,185 @@
+import re
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import CatalogEntry
+
+# порядок типов подсказок при одинаковом совпадении
+KINDS = ('category', 'product', 'model')
+# ключи индекса обрезаются: длиннее подсказку никто не набирает
+KEY_LENGTH = 32
+# начала слов: после пробела, знаков препинания и "/" в путях моделей
+WORD_START = re.compile(r'(?:^|(?<=[^\w]))\w', re.UNICODE)
+# версия подсказок: меняется после импорта и смены статуса магазина, но не после заказов
+VERSION_KEY = 'autocomplete_version'
+# готовый индекс в общем кэше, версия, по которой он построен, и время,
+# через которое упавшее построение ставится снова
+INDEX_KEY = 'autocomplete_index'
+INDEX_VERSION_KEY = 'autocomplete_index_version'
+REBUILD_TIMEOUT = 5 * 60
+
+
+def normalize(text):
+    return text.lower().replace('ё', 'е')
+
+
+class PrefixIndex:
+    """
+    Отсортированный список ключей для поиска подсказок по префиксу
+
+    Для каждой подсказки в индекс попадают ее окончания, начинающиеся с каждого
+    слова, поэтому "iph" находит "Смартфон Apple iPhone XR", а "xr" -
+    модель "apple/iphone/xr". Поиск - бинарный по отсортированным ключам.
+    """
+
+    def __init__(self, suggestions):
+        # suggestions - список пар (текст, тип)
+        self.suggestions = suggestions
+        entries = []
+        for number, (text, _) in enumerate(suggestions):
+            normalized = normalize(text)
+            for match in WORD_START.finditer(normalized):
+                entries.append((normalized[match.start():match.start() + KEY_LENGTH], number))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.numbers = array('L', (number for _, number in entries))
+
+    def lookup(self, prefix, limit=10):
+        """
+        Подсказки, у которых слово начинается с prefix
+
+        Сначала подсказки, начинающиеся с prefix целиком, затем по типу и длине.
+        """
+        prefix = normalize(prefix).strip()[:KEY_LENGTH]
+        if not prefix:
+            return []
+
+        position = bisect_left(self.keys, prefix)
+        found = set()
+        # просматриваем с запасом, чтобы было из чего выбрать лучшие
+        while position < len(self.keys) and len(found) < limit * 20 and self.keys[position].startswith(prefix):
+            found.add(self.numbers[position])
+            position += 1
+
+        ranked = sorted(found, key=lambda number: (
+            not normalize(self.suggestions[number][0]).startswith(prefix),
+            KINDS.index(self.suggestions[number][1]),
+            len(self.suggestions[number][0]),
+            self.suggestions[number][0]))
+        return [{'text': self.suggestions[number][0], 'type': self.suggestions[number][1]}
+                for number in ranked[:limit]]
+
+
+def build_index():
+    """
+    Строит индекс по категориям, товарам и моделям витрины активных магазинов
+    """
+    entries = CatalogEntry.objects.filter(shop_state=True).order_by()
+    suggestions = [(name, 'category') for name in entries.values_list('category_name', flat=True).distinct()]
+    suggestions.extend((name, 'product') for name in entries.values_list('product_name', flat=True).distinct())
+    suggestions.extend((model, 'model') for model in entries.exclude(model='').values_list(
+        'model', flat=True).distinct())
+    return PrefixIndex(suggestions)
+
+
+def autocomplete_version():
+    """
+    Общая для всех процессов версия подсказок
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # после очистки кэша версия не должна совпасть ни с одной из прежних
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_autocomplete_version():
+    """
+    После фиксации транзакции меняет версию подсказок и ставит задачу построения индекса
+
+    Вызывается по завершении импорта и при смене статуса магазина. Ошибка постановки задачи
+    только пишется в лог: транзакция уже зафиксирована, а индекс поставят снова запросы подсказок.
+    """
+    transaction.on_commit(_bump, robust=True)
+
+
+def _bump():
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        version = autocomplete_version()
+    _schedule_rebuild(version)
+
+
+def _schedule_rebuild(version):
+    """
+    Ставит задачу построения индекса версии version, если она еще не поставлена
+
+    Если построение упадет, задачу для той же версии можно поставить снова через REBUILD_TIMEOUT.
+    Возвращает True, если задача поставлена.
+    """
+    if not cache.add(f'{INDEX_KEY}:rebuild:{version}', True, REBUILD_TIMEOUT):
+        return False
+    from .celery_tasks import rebuild_autocomplete_index
+    rebuild_autocomplete_index.delay()
+    return True
+
+
+def publish_index():
+    """
+    Строит индекс и кладет его в общий кэш, откуда его забирают все процессы
+
+    Версия читается до построения: если она сменится за это время, уже поставлена
+    следующая задача. Сначала пишется индекс, затем короткий ключ с его версией,
+    который процессы проверяют при каждом запросе.
+    """
+    version = autocomplete_version()
+    cache.set(INDEX_KEY, {'version': version, 'index': build_index()}, None)
+    cache.set(INDEX_VERSION_KEY, version, None)
+
+
+class Autocomplete:
+    """
+    Индекс подсказок процесса, который обновляется при публикации нового индекса
+
+    Индекс строится не в потоке запроса, а задачей rebuild_autocomplete_index, и берется
+    из общего кэша. Процесс не чаще раза в AUTOCOMPLETE_CHECK_INTERVAL секунд читает
+    версию опубликованного индекса и скачивает сам индекс, только когда она сменилась.
+    Пока новый индекс не готов или его построение упало, процесс отвечает
+    по прежнему индексу, а без него - пустым списком.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.version = None
+        self.checked_at = 0
+
+    def suggest(self, prefix, limit=10):
+        now = time.monotonic()
+        if now - self.checked_at > getattr(settings, 'AUTOCOMPLETE_CHECK_INTERVAL', 1):
+            self.checked_at = now
+            self._refresh()
+        if self.index is None:
+            return []
+        return self.index.lookup(prefix, limit)
+
+    def _refresh(self):
+        versions = cache.get_many([VERSION_KEY, INDEX_VERSION_KEY])
+        version, published = versions.get(VERSION_KEY) or autocomplete_version(), versions.get(INDEX_VERSION_KEY)
+        # индекса нет или его построение упало; задача в eager-режиме Celery успевает опубликовать индекс сразу
+        if published != version and _schedule_rebuild(version):
+            published = cache.get(INDEX_VERSION_KEY)
+        if published is not None and published != self.version:
+            stored = cache.get(INDEX_KEY)
+            if stored is not None:
+                # версия - по короткому ключу, чтобы не скачивать индекс снова, если задачи записали их вразнобой
+                self.index, self.version = stored['index'], published
+
+
+autocomplete = Autocomplete()
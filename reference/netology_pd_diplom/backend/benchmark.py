@@ -0,0 +1,209 @@
+import random
+import resource
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.db.models import F, Sum
+from rest_framework.renderers import JSONRenderer
+from ujson import dumps as dump_json
+
+from .importer import import_data
+from .models import CatalogEntry, Order, OrderItem, ProductInfo
+from .price_list import load_price_list
+from .renderers import UJSONRenderer
+from .serializers import CATALOG_ENTRY_VALUES, CatalogEntrySerializer, OrderSerializer, serialize_catalog_entries, \
+    serialize_orders
+
+# категории синтетического прайс-листа: id, название и параметры, которые есть у ее товаров
+CATEGORIES = (
+    (224, 'Смартфоны', ('Диагональ (дюйм)', 'Разрешение (пикс)', 'Встроенная память (Гб)', 'Цвет')),
+    (15, 'Аксессуары', ('Цвет', 'Материал', 'Совместимость')),
+    (1, 'Flash-накопители', ('Объем (Гб)', 'Интерфейс', 'Цвет')),
+    (5, 'Телевизоры', ('Диагональ (дюйм)', 'Разрешение (пикс)', 'Smart TV', 'Частота обновления (Гц)')),
+    (31, 'Ноутбуки', ('Диагональ (дюйм)', 'Процессор', 'Оперативная память (Гб)', 'Накопитель (Гб)', 'Цвет')),
+    (44, 'Наушники', ('Тип', 'Беспроводные', 'Цвет')),
+)
+
+# значения параметров: у большинства параметров немного значений, как в реальных прайс-листах
+PARAMETER_VALUES = {
+    'Диагональ (дюйм)': (5.8, 6.1, 6.5, 6.7, 13.3, 15.6, 32, 43, 55, 65),
+    'Разрешение (пикс)': ('2688x1242', '1792x828', '2340x1080', '1920x1080', '3840x2160'),
+    'Встроенная память (Гб)': (64, 128, 256, 512),
+    'Цвет': ('черный', 'белый', 'серебристый', 'золотистый', 'красный', 'синий', 'зеленый'),
+    'Материал': ('пластик', 'силикон', 'кожа', 'металл'),
+    'Совместимость': ('Apple', 'Samsung', 'Xiaomi', 'универсальный'),
+    'Объем (Гб)': (16, 32, 64, 128, 256),
+    'Интерфейс': ('USB 2.0', 'USB 3.0', 'USB Type-C'),
+    'Smart TV': ('да', 'нет'),
+    'Частота обновления (Гц)': (50, 60, 100, 120),
+    'Процессор': ('Intel Core i3', 'Intel Core i5', 'Intel Core i7', 'AMD Ryzen 5', 'AMD Ryzen 7'),
+    'Оперативная память (Гб)': (8, 16, 32),
+    'Накопитель (Гб)': (256, 512, 1024),
+    'Тип': ('вкладыши', 'внутриканальные', 'накладные', 'полноразмерные'),
+    'Беспроводные': ('да', 'нет'),
+}
+
+BRANDS = ('Apple', 'Samsung', 'Xiaomi', 'Huawei', 'Sony', 'LG', 'Lenovo', 'Asus', 'Kingston', 'JBL')
+
+
+def parse_size(value):
+    """
+    Число позиций из строки вида 1000, 10k или 1M
+    """
+    value = value.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+
+def generate_price_list(stream, goods_count, seed=0):
+    """
+    Пишет в текстовый поток прайс-лист формата data/shop1.yaml из goods_count позиций
+
+    Файл пишется построчно, поэтому размер прайс-листа не ограничен памятью.
+    Строки выводятся в JSON-записи, которая является подмножеством YAML.
+    Одинаковый seed дает одинаковый прайс-лист.
+    """
+    rnd = random.Random(seed)
+    stream.write(f'shop: {_quote(f"Тестовый магазин {seed}")}\n')
+    stream.write('categories:\n')
+    for category_id, name, _ in CATEGORIES:
+        stream.write(f'  - id: {category_id}\n    name: {_quote(name)}\n')
+
+    stream.write('\ngoods:\n')
+    for number in range(goods_count):
+        category_id, category_name, parameter_names = rnd.choice(CATEGORIES)
+        brand = rnd.choice(BRANDS)
+        parameters = {name: rnd.choice(PARAMETER_VALUES[name]) for name in parameter_names}
+        # несколько магазинов продают одинаковые товары, поэтому названия повторяются
+        line = rnd.randrange(max(goods_count // 20, 1))
+        name = f'{category_name} {brand} {line} ({parameters.get("Цвет", "стандарт")})'
+        price = rnd.randrange(5, 2000) * 100
+
+        stream.write(f'  - id: {1000000 + number}\n'
+                     f'    category: {category_id}\n'
+                     f'    model: {_quote(f"{brand.lower()}/{line}")}\n'
+                     f'    name: {_quote(name)}\n'
+                     f'    price: {price}\n'
+                     f'    price_rrc: {price + rnd.randrange(0, 50) * 100}\n'
+                     f'    quantity: {rnd.randrange(0, 50)}\n'
+                     f'    parameters:\n')
+        for parameter, value in parameters.items():
+            stream.write(f'      {_quote(parameter)}: {_quote(value)}\n')
+
+
+def _quote(value):
+    return dump_json(value, ensure_ascii=False, escape_forward_slashes=False)
+
+
+@contextmanager
+def count_queries():
+    """
+    Считает запросы к базе, не сохраняя их текст, как это делает CaptureQueriesContext
+    """
+    counter = {'queries': 0}
+
+    def execute(execute, sql, params, many, context):
+        counter['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(execute):
+        yield counter
+
+
+def benchmark_import(user, path):
+    """
+    Импортирует прайс-лист из файла через import_data и возвращает метрики прогона
+
+    peak_rss_mb - пиковый RSS процесса с момента запуска, а не только этого прогона
+    (ru_maxrss в Linux считается в килобайтах).
+    """
+    with open(path, 'rb') as file, count_queries() as counter:
+        started = time.perf_counter()
+        result = import_data(user, load_price_list(file))
+        wall_time = time.perf_counter() - started
+
+    rows = result['products_imported']
+    return {
+        'rows': rows,
+        'wall_time': round(wall_time, 3),
+        'queries': counter['queries'],
+        'rows_per_second': round(rows / wall_time, 1) if wall_time else None,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'result': result
+    }
+
+
+def create_orders(user, items_per_order=10):
+    """
+    Раскладывает все активные позиции каталога по новым заказам пользователя, по items_per_order в заказе
+    """
+    product_info_ids = list(ProductInfo.objects.filter(is_active=True).order_by('id').values_list('id', flat=True))
+    for start in range(0, len(product_info_ids), items_per_order):
+        order = Order.objects.create(user=user, state='new')
+        OrderItem.objects.bulk_create([OrderItem(order=order, product_info_id=product_info_id, quantity=1)
+                                       for product_info_id in product_info_ids[start:start + items_per_order]])
+
+
+def benchmark_serialization(repeat=5, page_size=200):
+    """
+    Сравнивает сериализаторы DRF и быстрый путь на всей витрине и всех заказах в базе
+
+    Ответы строятся страницами, как в API: по page_size позиций витрины
+    и по page_size / 10 заказов. Замеряется ответ целиком: запросы к базе,
+    построение данных и JSON. Для каждого списка возвращает число строк, лучшее
+    из repeat время на 1000 строк в миллисекундах для обоих путей, ускорение
+    и совпадение ответов побайтно.
+    """
+    entry_ids = list(CatalogEntry.objects.order_by('pk').values_list('pk', flat=True))
+    entry_pages = [entry_ids[start:start + page_size] for start in range(0, len(entry_ids), page_size)]
+    order_ids = list(Order.objects.order_by('id').values_list('id', flat=True))
+    orders_per_page = max(page_size // 10, 1)
+    order_pages = [order_ids[start:start + orders_per_page] for start in range(0, len(order_ids), orders_per_page)]
+
+    def entries(ids):
+        return CatalogEntry.objects.filter(pk__in=ids).order_by('pk')
+
+    def orders(ids):
+        return Order.objects.filter(id__in=ids).annotate(
+            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).order_by('id')
+
+    def prefetched_orders(ids):
+        return orders(ids).prefetch_related(
+            'ordered_items__product_info__product__category',
+            'ordered_items__product_info__product_parameters__parameter').select_related('contact')
+
+    listings = (
+        ('catalog', len(entry_ids),
+         lambda: [JSONRenderer().render(CatalogEntrySerializer(entries(ids), many=True).data) for ids in entry_pages],
+         lambda: [UJSONRenderer().render(serialize_catalog_entries(entries(ids).values(*CATALOG_ENTRY_VALUES)))
+                  for ids in entry_pages]),
+        ('orders', OrderItem.objects.count(),
+         lambda: [JSONRenderer().render(OrderSerializer(prefetched_orders(ids), many=True).data)
+                  for ids in order_pages],
+         lambda: [UJSONRenderer().render(serialize_orders(orders(ids))) for ids in order_pages]),
+    )
+
+    results = []
+    for name, rows, serializer, fast in listings:
+        serializer_time, serializer_content = _best_time(serializer, repeat)
+        fast_time, fast_content = _best_time(fast, repeat)
+        results.append({
+            'listing': name,
+            'rows': rows,
+            'serializer_ms_per_1k': round(serializer_time * 1000 * 1000 / rows, 2) if rows else None,
+            'fast_ms_per_1k': round(fast_time * 1000 * 1000 / rows, 2) if rows else None,
+            'speedup': round(serializer_time / fast_time, 1) if fast_time else None,
+            'identical': serializer_content == fast_content,
+        })
+    return results
+
+
+def _best_time(func, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
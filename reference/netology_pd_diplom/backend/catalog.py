@@ -0,0 +1,258 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .facets import rebuild_facets
+from .filters import shop_id_param
+from .models import CatalogEntry, ProductFacet, ProductInfo, ProductParameter
+from .prices import refresh_price_stats
+from .search import index_products
+
+CATALOG_VERSION_KEY = 'catalog_version'
+# сколько id передается в один запрос IN (...): SQLite ограничивает число параметров
+ENTRIES_BATCH_SIZE = 500
+# позиции, измененные в обход импорта и заказов, копятся до фиксации транзакции
+_changes = threading.local()
+
+
+def _version_key(shop_id):
+    return CATALOG_VERSION_KEY if shop_id is None else f'{CATALOG_VERSION_KEY}:shop:{shop_id}'
+
+
+def catalog_version(shop_id=None):
+    """
+    Общая для всех процессов версия видимого покупателям каталога
+
+    Без shop_id - версия всего каталога, иначе - позиций одного магазина.
+    Меняется при применении импорта и переключении статуса магазина. Процессы
+    сравнивают ее со своей, чтобы понять, что построенные в памяти структуры устарели.
+    """
+    key = _version_key(shop_id)
+    version = cache.get(key)
+    if version is None:
+        # после очистки кэша версия не должна совпасть ни с одной из прежних
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_catalog_version(*shop_ids):
+    """
+    Увеличивает версию каталога и версии магазинов shop_ids после фиксации текущей транзакции
+    """
+    keys = [_version_key(None)] + [_version_key(shop_id) for shop_id in shop_ids]
+    transaction.on_commit(lambda: _bump(keys))
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+
+
+def catalog_page_key(request):
+    """
+    Ключ кэша готовой страницы каталога
+
+    Страница с фильтром shop_id зависит только от версии этого магазина,
+    остальные - от версии всего каталога. URL запроса входит в ключ целиком,
+    потому что из него строятся ссылки next и previous.
+    При неверном shop_id выбрасывает ValueError.
+    """
+    url_digest = hashlib.sha256(request.build_absolute_uri().encode()).hexdigest()
+    return f'catalog_page:{catalog_version(shop_id_param(request.query_params))}:{url_digest}'
+
+
+def catalog_etag(request, *args, **kwargs):
+    """
+    ETag списков категорий и магазинов для django.views.decorators.http.condition
+
+    Строится по версии каталога без обращения к таблицам. JSON и браузерный
+    API - разные представления, поэтому формат ответа тоже входит в ETag.
+    """
+    return f'{request.accepted_renderer.format}-{catalog_version()}'
+
+
+def catalog_page_etag(request, *args, **kwargs):
+    """
+    ETag страницы товаров: как у catalog_etag, но с фильтром shop_id - по версии магазина
+
+    При неверном shop_id ETag нет, и запрос доходит до представления, которое отвечает 400.
+    """
+    try:
+        shop_id = shop_id_param(request.query_params)
+    except ValueError:
+        return None
+    return f'{request.accepted_renderer.format}-{catalog_version(shop_id)}'
+
+
+def refresh_catalog_entries(product_info_ids):
+    """
+    Пересобирает строки CatalogEntry для позиций каталога по id
+
+    Неактивные позиции из витрины удаляются.
+    """
+    product_info_ids = list(product_info_ids)
+    for start in range(0, len(product_info_ids), ENTRIES_BATCH_SIZE):
+        batch = product_info_ids[start:start + ENTRIES_BATCH_SIZE]
+        product_infos = ProductInfo.objects.filter(id__in=batch, is_active=True).select_related(
+            'shop', 'product__category')
+        CatalogEntry.objects.filter(product_info_id__in=batch).delete()
+        CatalogEntry.objects.bulk_create([
+            CatalogEntry(product_info_id=product_info.id,
+                         shop_id=product_info.shop_id,
+                         shop_state=product_info.shop.state,
+                         product_id=product_info.product_id,
+                         product_name=product_info.product.name,
+                         category_id=product_info.product.category_id,
+                         category_name=product_info.product.category.name,
+                         model=product_info.model,
+                         quantity=product_info.quantity,
+                         price=product_info.price,
+                         price_rrc=product_info.price_rrc,
+                         parameters=product_info.parameters)
+            for product_info in product_infos])
+
+
+def refresh_stock(product_infos):
+    """
+    Переносит в витрину остатки позиций, измененные заказом или его отменой, пересчитывает
+    сравнение цен их товаров и счетчики в наличии ProductFacet и меняет версии магазинов
+    """
+    product_infos = {product_info.id: product_info for product_info in product_infos}
+    # прежний остаток - в витрине; позиций без строки витрины нет и в ProductFacet
+    entries = {product_info_id: (quantity, category_id) for product_info_id, quantity, category_id in
+               CatalogEntry.objects.filter(product_info_id__in=product_infos).values_list(
+                   'product_info_id', 'quantity', 'category_id')}
+    for product_info in product_infos.values():
+        CatalogEntry.objects.filter(product_info_id=product_info.id).update(quantity=product_info.quantity)
+    _refresh_facet_stock(product_infos, entries)
+    # позиция без остатка выпадает из сравнения цен
+    refresh_price_stats({product_info.product_id for product_info in product_infos.values()})
+    bump_catalog_version(*{product_info.shop_id for product_info in product_infos.values()})
+
+
+def _refresh_facet_stock(product_infos, entries):
+    """
+    Меняет ProductFacet.in_stock для позиций, которые закончились или снова появились в наличии
+    """
+    crossed = {}
+    for product_info_id, (quantity, category_id) in entries.items():
+        product_info = product_infos[product_info_id]
+        delta = (product_info.quantity > 0) - (quantity > 0)
+        if delta:
+            crossed[product_info_id] = (product_info.shop_id, category_id, delta)
+    if not crossed:
+        return
+
+    deltas = {}
+    for shop_id, category_id, delta in crossed.values():
+        key = (shop_id, category_id, None, '')
+        deltas[key] = deltas.get(key, 0) + delta
+    for product_info_id, parameter_id, value in ProductParameter.objects.filter(
+            product_info_id__in=crossed).values_list('product_info_id', 'parameter_id', 'value'):
+        shop_id, category_id, delta = crossed[product_info_id]
+        key = (shop_id, category_id, parameter_id, value)
+        deltas[key] = deltas.get(key, 0) + delta
+    for (shop_id, category_id, parameter_id, value), delta in deltas.items():
+        if delta:
+            ProductFacet.objects.filter(shop_id=shop_id, category_id=category_id, parameter_id=parameter_id,
+                                        value=value).update(in_stock=F('in_stock') + delta)
+
+
+def refresh_parameter_documents(product_info_ids):
+    """
+    Пересобирает ProductInfo.parameters из ProductParameter для позиций по id
+
+    Нужно для каталогов, загруженных до появления поля, и для параметров, измененных в обход импорта.
+    """
+    product_info_ids = list(product_info_ids)
+    for start in range(0, len(product_info_ids), ENTRIES_BATCH_SIZE):
+        batch = product_info_ids[start:start + ENTRIES_BATCH_SIZE]
+        parameters = {product_info_id: [] for product_info_id in batch}
+        for product_info_id, name, value in ProductParameter.objects.filter(product_info_id__in=batch).order_by(
+                'id').values_list('product_info_id', 'parameter__name', 'value'):
+            parameters[product_info_id].append({'parameter': name, 'value': value})
+        ProductInfo.objects.bulk_update([ProductInfo(id=product_info_id, parameters=document)
+                                         for product_info_id, document in parameters.items()], ['parameters'])
+
+
+def remove_catalog_entries(product_info_ids):
+    """
+    Удаляет позиции каталога из витрины
+    """
+    product_info_ids = list(product_info_ids)
+    for start in range(0, len(product_info_ids), ENTRIES_BATCH_SIZE):
+        CatalogEntry.objects.filter(product_info_id__in=product_info_ids[start:start + ENTRIES_BATCH_SIZE]).delete()
+
+
+@contextmanager
+def bulk_catalog_update():
+    """
+    Блок, в котором витрину измененных позиций пересчитывает сам вызывающий код
+
+    Импорт и заказы обновляют CatalogEntry, поиск и цены пачками, поэтому сигналы
+    ProductInfo и ProductParameter внутри блока позиции не запоминают.
+    """
+    muted = getattr(_changes, 'muted', False)
+    _changes.muted = True
+    try:
+        yield
+    finally:
+        _changes.muted = muted
+
+
+def product_info_changed(product_info_id, product_id=None, shop_id=None, parameters=False):
+    """
+    Запоминает позицию, измененную в обход импорта и заказов, например в админке
+
+    Витрина, поисковый индекс, ProductFacet, ProductPriceStats и версии каталога
+    пересчитываются один раз после фиксации транзакции: удаление магазина каскадом
+    удаляет тысячи позиций. product_id и shop_id нужны для удаленных позиций,
+    parameters - изменились параметры, и ProductInfo.parameters надо пересобрать.
+    """
+    if getattr(_changes, 'muted', False):
+        return
+    pending = getattr(_changes, 'pending', None)
+    if pending is None:
+        pending = _changes.pending = {'product_info_ids': set(), 'documents': set(), 'product_ids': set(),
+                                      'shop_ids': set()}
+    pending['product_info_ids'].add(product_info_id)
+    if parameters:
+        pending['documents'].add(product_info_id)
+    if product_id is not None:
+        pending['product_ids'].add(product_id)
+    if shop_id is not None:
+        pending['shop_ids'].add(shop_id)
+    # при откате транзакции позиции останутся в pending и будут пересчитаны со следующими - это безопасно
+    transaction.on_commit(_refresh_changed)
+
+
+def _refresh_changed():
+    pending, _changes.pending = getattr(_changes, 'pending', None), None
+    if pending is None:
+        return
+    product_info_ids = list(pending['product_info_ids'])
+    product_ids, shop_ids = pending['product_ids'], pending['shop_ids']
+    with transaction.atomic():
+        refresh_parameter_documents(pending['documents'])
+        for start in range(0, len(product_info_ids), ENTRIES_BATCH_SIZE):
+            batch = product_info_ids[start:start + ENTRIES_BATCH_SIZE]
+            # прежние товар и магазин позиции - в витрине, новые - в ProductInfo
+            for model in (CatalogEntry, ProductInfo):
+                for product_id, shop_id in model.objects.filter(pk__in=batch).values_list('product_id', 'shop_id'):
+                    product_ids.add(product_id)
+                    shop_ids.add(shop_id)
+            refresh_catalog_entries(batch)
+            index_products(batch)
+        refresh_price_stats(product_ids)
+        for shop_id in shop_ids:
+            rebuild_facets(shop_id)
+        bump_catalog_version(*shop_ids)
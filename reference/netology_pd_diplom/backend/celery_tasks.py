@@ -1,105 +1,206 @@
-from celery import shared_task
+from celery import chord, shared_task
 from django.core.mail import send_mail
 from django.conf import settings
-from yaml import load as load_yaml, Loader
-from requests import get
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
+from ujson import loads as load_json
 
-from .models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, OrderItem, Contact, \
-    ConfirmEmailToken
+from .autocomplete import publish_index
+from .importer import CatalogImporter, batches, fetch_shop_price_list, is_imported, write_chunks
+from .price_list import file_digest, load_price_list, price_list_storage
+from .progress import ImportProgress
+from .models import Shop, Order, OrderItem, Contact, ConfirmEmailToken
 
 
-@shared_task
-def async_partner_update(user_id, yaml_data, url):
+@shared_task(bind=True)
+def async_partner_update(self, user_id, file_name, url):
     """
-    Асинхронная задача для импорта товаров
+    Асинхронная задача для импорта товаров (координатор)
+
+    file_name - имя прайс-листа в price_list_storage, сохраненного через spool_price_list.
+    Координатор создает магазин, категории, товары и параметры, раскладывает позиции
+    по частям и запускает их параллельный импорт, после которого finish_partner_import
+    снимает с продажи пропавшие позиции и отправляет отчет. Ход импорта доступен
+    через ImportProgress по id этой задачи.
     """
+    storage = price_list_storage()
+    task_id = self.request.id
+    progress = ImportProgress(task_id, user_id)
+    importer, chunks = None, []
     try:
         from .models import User
 
         user = User.objects.get(id=user_id)
 
         if user.type != 'shop':
-            return {'Status': False, 'Error': 'User is not a shop'}
+            return progress.finish({'Status': False, 'Error': 'User is not a shop'})
 
-        if yaml_data:
-            # Импорт из YAML данных
-            data = load_yaml(yaml_data, Loader=Loader)
-            result = import_data(user, data)
-        elif url:
+        shop_updates = {}
+        if not file_name and url:
             # Импорт из URL
             validate_url = URLValidator()
             try:
                 validate_url(url)
             except ValidationError as e:
-                return {'Status': False, 'Error': str(e)}
-
-            stream = get(url).content
-            data = load_yaml(stream, Loader=Loader)
-            result = import_data(user, data)
-        else:
-            return {'Status': False, 'Error': 'No data provided'}
-
-        # Отправка email отчета
-        send_import_report.delay(
-            user.email,
-            result['categories_processed'],
-            result['products_imported']
-        )
+                return progress.finish({'Status': False, 'Error': str(e)})
+
+            progress.set_phase('downloading')
+            price_list = fetch_shop_price_list(user, url)
+            if price_list.name is None:
+                return progress.finish({'Status': True, 'Message': 'Price list is unchanged',
+                                        'Details': {'feed_unchanged': True}})
+            file_name = price_list.name
+            shop_updates = {'url': url, 'url_etag': price_list.etag, 'url_last_modified': price_list.last_modified}
+        elif not file_name:
+            return progress.finish({'Status': False, 'Error': 'No data provided'})
+
+        # Читаем прайс-лист потоком с диска
+        with storage.open(file_name, 'rb') as file:
+            digest = file_digest(file)
+            if is_imported(user, digest):
+                Shop.objects.filter(user_id=user.id).update(**shop_updates)
+                return progress.finish({'Status': True, 'Message': 'Price list is unchanged',
+                                        'Details': {'feed_unchanged': True}})
+            shop_updates['feed_digest'] = digest
+
+            progress.set_phase('parsing')
+            data = load_price_list(file)
+            shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=user.id)
+            importer = CatalogImporter(shop)
+            importer.import_categories(data['categories'])
+            chunks = write_chunks(importer, data['goods'], file_name.rsplit('.', 1)[0])
+
+        progress.set_phase('importing', total=sum(chunk.size for chunk in chunks))
+        chord([import_goods_chunk.s(shop.id, chunk.name, task_id, importer.import_id) for chunk in chunks])(
+            finish_partner_import.s(user.id, shop.id, importer.categories_processed, shop_updates, task_id,
+                                    importer.import_id).on_error(
+                abort_partner_import.s(user.id, shop.id, task_id, importer.import_id,
+                                       [chunk.name for chunk in chunks])))
 
         return {
             'Status': True,
-            'Message': 'Import completed successfully',
-            'Details': result
+            'Message': 'Import started',
+            'Details': {'chunks': len(chunks)}
         }
 
     except Exception as e:
+        # части и подготовленные строки больше никто не заберет
+        for chunk in chunks:
+            storage.delete(chunk.name)
+        if importer is not None:
+            importer.discard()
         # Отправка email об ошибке
         if 'user' in locals():
             send_import_error.delay(user.email, str(e))
-        return {'Status': False, 'Error': str(e)}
+        return progress.finish({'Status': False, 'Error': str(e)})
+
+    finally:
+        if file_name:
+            storage.delete(file_name)
+
+
+@shared_task
+def import_goods_chunk(shop_id, chunk_name, task_id=None, import_id=None):
+    """
+    Импорт одной части прайс-листа, подготовленной координатором
+
+    Части параллельно сравнивают позиции с каталогом и складывают изменения в StagedProductInfo
+    под import_id; видны они становятся только в finish_partner_import. task_id - id задачи-координатора,
+    в прогресс которой пишется число обработанных позиций.
+    """
+    storage = price_list_storage()
+    try:
+        with storage.open(chunk_name, 'rb') as file:
+            goods = load_json(file.read())
+
+        importer = CatalogImporter(Shop.objects.get(id=shop_id),
+                                   progress=ImportProgress(task_id) if task_id else None, import_id=import_id)
+        for batch in batches(goods, importer.batch_size):
+            importer.stage_batch(batch)
+
+        return {
+            'inserted': importer.inserted,
+            'updated': importer.updated,
+            'unchanged': importer.unchanged
+        }
+
+    except Exception as e:
+        return {'Error': str(e)}
+
+    finally:
+        storage.delete(chunk_name)
 
 
-def import_data(user, data):
+@shared_task
+def finish_partner_import(results, user_id, shop_id, categories_processed, shop_updates, task_id=None,
+                          import_id=None):
+    """
+    Завершение импорта: применяет подготовленные изменения и отправляет отчет
+
+    Новые, измененные и пропавшие позиции становятся видны покупателям одной транзакцией.
+    """
+    from .models import User
+
+    progress = ImportProgress(task_id, user_id)
+    user = User.objects.get(id=user_id)
+    importer = CatalogImporter(Shop.objects.get(id=shop_id), import_id=import_id)
+    errors = [result['Error'] for result in results if 'Error' in result]
+    if errors:
+        # часть прайс-листа не загрузилась - каталог остается прежним, хэш не сохраняем
+        importer.discard()
+        send_import_error.delay(user.email, '; '.join(errors))
+        return progress.finish({'Status': False, 'Error': '; '.join(errors)})
+
+    progress.set_phase('finishing')
+    importer.categories_processed = categories_processed
+    for result in results:
+        importer.add_result(result)
+    try:
+        importer.finish(**shop_updates)
+    except Exception as e:
+        importer.discard()
+        send_import_error.delay(user.email, str(e))
+        return progress.finish({'Status': False, 'Error': str(e)})
+
+    result = importer.result()
+    send_import_report.delay(
+        user.email,
+        result['categories_processed'],
+        result['products_imported']
+    )
+
+    return progress.finish({
+        'Status': True,
+        'Message': 'Import completed successfully',
+        'Details': result
+    })
+
+
+@shared_task
+def abort_partner_import(request, exc, traceback, user_id, shop_id, task_id=None, import_id=None, chunk_names=()):
+    """
+    Обработчик ошибки chord импорта
+
+    Вызывается, если задача-часть или finish_partner_import упали целиком (например,
+    воркер был остановлен): удаляет подготовленные изменения и оставшиеся файлы частей
+    и помечает импорт неудавшимся.
+    """
+    from .models import User
+
+    storage = price_list_storage()
+    for chunk_name in chunk_names:
+        storage.delete(chunk_name)
+    CatalogImporter(Shop.objects.get(id=shop_id), import_id=import_id).discard()
+    send_import_error.delay(User.objects.get(id=user_id).email, str(exc))
+    return ImportProgress(task_id, user_id).finish({'Status': False, 'Error': str(exc)})
+
+
+@shared_task
+def rebuild_autocomplete_index():
     """
-    Общая функция импорта данных
+    Перестраивает индекс подсказок вне потока запроса, веб-процессы забирают его из кэша
     """
-    shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=user.id)
-
-    # Импорт категорий
-    for category in data['categories']:
-        category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-        category_object.shops.add(shop.id)
-        category_object.save()
-
-    # Удаляем старые товары и импортируем новые
-    ProductInfo.objects.filter(shop_id=shop.id).delete()
-
-    imported_count = 0
-    for item in data['goods']:
-        product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
-
-        product_info = ProductInfo.objects.create(product_id=product.id,
-                                                  external_id=item['id'],
-                                                  model=item['model'],
-                                                  price=item['price'],
-                                                  price_rrc=item['price_rrc'],
-                                                  quantity=item['quantity'],
-                                                  shop_id=shop.id)
-        imported_count += 1
-
-        # Импорт параметров
-        for name, value in item['parameters'].items():
-            parameter_object, _ = Parameter.objects.get_or_create(name=name)
-            ProductParameter.objects.create(product_info_id=product_info.id,
-                                            parameter_id=parameter_object.id,
-                                            value=value)
-
-    return {
-        'categories_processed': len(data['categories']),
-        'products_imported': imported_count
-    }
+    publish_index()
 
 
 @shared_task
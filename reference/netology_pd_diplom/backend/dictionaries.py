@@ -0,0 +1,100 @@
+import time
+from threading import Lock
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Category, Parameter
+
+
+class NameDictionary:
+    """
+    Общий для процесса словарь ключ -> id для справочных моделей
+
+    Загружается из базы при первом обращении, дальше повторяющиеся ключи
+    не требуют запросов. Недостающие записи создаются через
+    bulk_create(ignore_conflicts=True): при параллельных импортах конфликт
+    разрешает уникальный индекс, после чего id перечитываются из базы.
+    Прочитанное внутри транзакции попадает в словарь только после ее фиксации,
+    чтобы откат не оставил в нем id несуществующих записей.
+    Поколение словаря хранится в общем кэше: clear в любом процессе увеличивает
+    его, и остальные веб-процессы и воркеры перечитывают словарь при следующем обращении.
+    """
+
+    def __init__(self, model, key='name'):
+        self.model = model
+        self.key = key
+        self.generation_key = f'name_dictionary:{model._meta.label_lower}:{key}'
+        self._ids = None
+        self._generation = None
+        self._lock = Lock()
+
+    def get_ids(self, keys, defaults=None):
+        """
+        Возвращает словарь ключ -> id для keys, создавая недостающие записи
+
+        defaults - словарь ключ -> значения остальных полей для новых записей.
+        """
+        keys = set(keys)
+        generation = self.generation()
+        with self._lock:
+            ids = self._ids if self._generation == generation else None
+        if ids is None:
+            ids = dict(self.model.objects.values_list(self.key, 'id'))
+            transaction.on_commit(lambda: self._remember(ids, generation, loaded=True))
+        found = {key: ids[key] for key in keys if key in ids}
+
+        missing = keys - found.keys()
+        if missing:
+            defaults = defaults or {}
+            self.model.objects.bulk_create([self.model(**{self.key: key}, **defaults.get(key, {}))
+                                            for key in missing], ignore_conflicts=True)
+            created = dict(self.model.objects.filter(**{f'{self.key}__in': missing}).values_list(self.key, 'id'))
+            found.update(created)
+            transaction.on_commit(lambda: self._remember(created, generation))
+        return found
+
+    def generation(self):
+        """
+        Текущее поколение словаря из общего кэша
+        """
+        generation = cache.get(self.generation_key)
+        if generation is None:
+            cache.add(self.generation_key, time.time_ns(), None)
+            generation = cache.get(self.generation_key)
+        return generation
+
+    def clear(self):
+        """
+        Сбрасывает словарь во всех процессах, при следующем обращении он загрузится заново
+
+        Поколение увеличивается после фиксации транзакции, чтобы другие процессы
+        не перечитали словарь до того, как изменение станет им видно.
+        """
+        with self._lock:
+            self._ids = None
+        transaction.on_commit(self._bump_generation)
+
+    def _bump_generation(self):
+        try:
+            cache.incr(self.generation_key)
+        except ValueError:
+            cache.add(self.generation_key, time.time_ns(), None)
+        with self._lock:
+            self._ids = None
+
+    def _remember(self, ids, generation, loaded=False):
+        """
+        Добавляет ids в словарь; loaded - ids прочитаны из базы целиком
+        """
+        with self._lock:
+            if loaded and (self._ids is None or self._generation != generation):
+                self._ids, self._generation = dict(ids), generation
+            elif self._ids is not None and self._generation == generation:
+                self._ids.update(ids)
+
+
+# названия параметров товаров
+parameter_ids = NameDictionary(Parameter)
+# категории приходят в прайс-листе со своими id, поэтому словарь отвечает на вопрос "есть ли такая категория"
+category_ids = NameDictionary(Category, key='id')
@@ -0,0 +1,102 @@
+from django.db.models import Count, Q, Sum
+
+from .filters import RANGE_FILTERS, filter_products, shop_id_param
+from .models import CatalogEntry, ProductFacet, ProductInfo, ProductParameter
+
+
+def rebuild_facets(shop_id):
+    """
+    Пересчитывает ProductFacet магазина по его активным позициям
+
+    Группировка идет только по позициям одного магазина. Вызывается
+    в транзакции применения импорта, поэтому счетчики меняются вместе с каталогом.
+    """
+    in_stock = Count('id', filter=Q(quantity__gt=0))
+    facets = [ProductFacet(shop_id=shop_id, category_id=row['product__category_id'], count=row['count'],
+                           in_stock=row['in_stock'])
+              for row in ProductInfo.objects.filter(shop_id=shop_id, is_active=True).values(
+                  'product__category_id').annotate(count=Count('id'), in_stock=in_stock).order_by()]
+
+    in_stock = Count('id', filter=Q(product_info__quantity__gt=0))
+    facets.extend(ProductFacet(shop_id=shop_id, category_id=row['product_info__product__category_id'],
+                               parameter_id=row['parameter_id'], value=row['value'], count=row['count'],
+                               in_stock=row['in_stock'])
+                  for row in ProductParameter.objects.filter(
+                      product_info__shop_id=shop_id, product_info__is_active=True).values(
+                      'product_info__product__category_id', 'parameter_id', 'value').annotate(
+                      count=Count('id'), in_stock=in_stock).order_by())
+
+    ProductFacet.objects.filter(shop_id=shop_id).delete()
+    ProductFacet.objects.bulk_create(facets, batch_size=1000)
+
+
+def facet_counts(query_params):
+    """
+    Счетчики позиций по категориям, магазинам и значениям параметров
+
+    Фильтры shop_id, category_id и in_stock берутся из ProductFacet без группировки
+    по каталогу. С диапазонами цен и фильтрами по параметрам, для которых агрегатов нет,
+    позиции считаются по витрине CatalogEntry, отобранной фильтрами, а значения
+    параметров - только у отобранных позиций.
+    При неверном значении фильтра выбрасывает ValueError.
+    """
+    shop_id = shop_id_param(query_params)
+    category_id = query_params.get('category_id')
+    if category_id:
+        try:
+            category_id = int(category_id)
+        except ValueError:
+            raise ValueError('category_id должен быть целым числом')
+    if any(query_params.get(param) for param in (*RANGE_FILTERS, 'param')):
+        return _entry_counts(query_params)
+
+    facets = ProductFacet.objects.filter(shop__state=True)
+    if shop_id is not None:
+        facets = facets.filter(shop_id=shop_id)
+    if category_id:
+        facets = facets.filter(category_id=category_id)
+    count = Sum('in_stock' if query_params.get('in_stock', '').lower() in ('true', '1', 'yes') else 'count')
+
+    totals = facets.filter(parameter__isnull=True)
+    return {
+        'total': totals.aggregate(total=count)['total'] or 0,
+        'categories': _counts(totals.values_list('category_id', 'category__name').annotate(count=count)),
+        'shops': _counts(totals.values_list('shop_id', 'shop__name').annotate(count=count)),
+        'parameters': _group_parameters(facets.filter(parameter__isnull=False).values_list(
+            'parameter__name', 'value').annotate(count=count)),
+    }
+
+
+def _entry_counts(query_params):
+    """
+    Счетчики по позициям витрины, отобранным всеми фильтрами каталога
+    """
+    entries = filter_products(CatalogEntry.objects.filter(shop_state=True), query_params, 'category_id')
+    count = Count('pk')
+    return {
+        'total': entries.count(),
+        'categories': _counts(entries.values_list('category_id', 'category_name').annotate(count=count)),
+        'shops': _counts(entries.values_list('shop_id', 'shop__name').annotate(count=count)),
+        'parameters': _group_parameters(ProductParameter.objects.filter(
+            product_info_id__in=entries.values('pk')).values_list('parameter__name', 'value').annotate(
+            count=Count('id'))),
+    }
+
+
+def _counts(rows):
+    """
+    Строки (id, название, количество) в виде списка словарей по алфавиту
+    """
+    return sorted(({'id': id_, 'name': name, 'count': count} for id_, name, count in rows.order_by() if count),
+                  key=lambda item: item['name'])
+
+
+def _group_parameters(rows):
+    """
+    Группирует строки (параметр, значение, количество) по параметрам
+    """
+    parameters = {}
+    for name, value, count in rows.order_by('parameter__name', 'value'):
+        if count:
+            parameters.setdefault(name, []).append({'value': value, 'count': count})
+    return [{'name': name, 'values': values} for name, values in parameters.items()]
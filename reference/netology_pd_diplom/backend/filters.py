@@ -0,0 +1,94 @@
+import re
+
+from .models import ProductParameter
+from .parameters import parameter_unit, parse_number
+
+# фильтр по параметру: название, оператор и значение, например "Встроенная память (Гб)>=256"
+PARAMETER_FILTER = re.compile(r'^(?P<name>[^<>!=]+?)\s*(?P<operator>>=|<=|!=|=|>|<)\s*(?P<value>.*)$')
+
+# query-параметр -> условие на поле ProductInfo
+RANGE_FILTERS = {
+    'price_min': 'price__gte',
+    'price_max': 'price__lte',
+    'price_rrc_min': 'price_rrc__gte',
+    'price_rrc_max': 'price_rrc__lte',
+}
+
+
+def shop_id_param(query_params):
+    """
+    shop_id из query-параметров числом или None, если фильтра нет
+
+    По нему строятся ключи версий магазинов, поэтому "01" и "1" должны давать один ключ.
+    При неверном значении выбрасывает ValueError.
+    """
+    value = query_params.get('shop_id')
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError('shop_id должен быть целым числом')
+
+
+def filter_products(queryset, query_params, category_field='product__category_id'):
+    """
+    Применяет к queryset ProductInfo или CatalogEntry фильтры каталога из query-параметров
+
+    shop_id, category_id - магазин и категория; price_min, price_max,
+    price_rrc_min, price_rrc_max - диапазоны цен; in_stock=true - только
+    товары в наличии; param - фильтр по параметру вида "Цвет=черный" или
+    "Встроенная память (Гб)>=256", можно указать несколько раз. Операторы >, >=, <, <= сравнивают значения как числа,
+    после числа можно указать единицу: "Диагональ (дюйм)>=6 дюйм".
+    category_field - поле категории в модели queryset.
+    При неверном значении выбрасывает ValueError.
+    """
+    shop_id = shop_id_param(query_params)
+    if shop_id is not None:
+        queryset = queryset.filter(shop_id=shop_id)
+    if query_params.get('category_id'):
+        queryset = queryset.filter(**{category_field: query_params['category_id']})
+
+    for param, lookup in RANGE_FILTERS.items():
+        value = query_params.get(param)
+        if value:
+            try:
+                queryset = queryset.filter(**{lookup: int(value)})
+            except ValueError:
+                raise ValueError(f'{param} должен быть целым числом')
+
+    if query_params.get('in_stock', '').lower() in ('true', '1', 'yes'):
+        queryset = queryset.filter(quantity__gt=0)
+
+    for parameter_filter in query_params.getlist('param'):
+        queryset = queryset.filter(pk__in=parameter_subquery(parameter_filter))
+
+    return queryset
+
+
+def parameter_subquery(parameter_filter):
+    """
+    Подзапрос id позиций, подходящих под фильтр по параметру
+
+    Выборка идет по индексу (parameter, value, product_info) без обращения к самой таблице.
+    """
+    match = PARAMETER_FILTER.match(parameter_filter)
+    if not match:
+        raise ValueError(f'Неверный фильтр по параметру: {parameter_filter}')
+    name, operator, value = match.group('name').strip(), match.group('operator'), match.group('value').strip()
+
+    parameters = ProductParameter.objects.filter(parameter__name=name)
+    if operator == '=':
+        parameters = parameters.filter(value=value)
+    elif operator == '!=':
+        parameters = parameters.exclude(value=value)
+    else:
+        number = parse_number(value, parameter_unit(name))
+        if number is None:
+            raise ValueError(f'Для оператора {operator} нужно число в единицах параметра: {parameter_filter}')
+        # числа разобраны при импорте, сравнение идет по индексу (parameter, value_number, product_info);
+        # нечисловые значения хранятся с NULL и в диапазон не попадают
+        lookup = {'>': 'gt', '>=': 'gte', '<': 'lt', '<=': 'lte'}[operator]
+        parameters = parameters.filter(**{f'value_number__{lookup}': number})
+
+    return parameters.values('product_info_id')
@@ -0,0 +1,416 @@
+from collections import namedtuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from ujson import dumps as dump_json
+
+from .autocomplete import bump_autocomplete_version
+from .catalog import bulk_catalog_update, bump_catalog_version, refresh_catalog_entries, remove_catalog_entries
+from .dictionaries import category_ids, parameter_ids
+from .facets import rebuild_facets
+from .models import CatalogEntry, Shop, Product, ProductInfo, Parameter, ProductParameter, StagedExternalId, \
+    StagedProductInfo
+from .parameters import parameter_unit, parse_number
+from .prices import refresh_price_stats
+from .price_list import fetch_price_list, file_digest, load_price_list, price_list_storage
+from .search import index_products, unindex_products
+
+
+# поля ProductInfo, которые сравниваются с прайс-листом
+PRODUCT_INFO_FIELDS = ('product_id', 'model', 'price', 'price_rrc', 'quantity', 'is_active')
+# поля позиции, которые переносятся в ProductInfo через StagedProductInfo
+STAGED_FIELDS = ('product_id', 'model', 'price', 'price_rrc', 'quantity')
+
+
+class CatalogImporter:
+    """
+    Пакетный инкрементальный импорт каталога магазина
+
+    Категории и параметры сопоставляются через общие словари процесса,
+    товары - через словарь пачки.
+    Позиции прайс-листа сопоставляются с ProductInfo магазина по external_id,
+    новые и измененные складываются в StagedProductInfo, неизменные не трогаются.
+    finish переносит подготовленное в каталог одной транзакцией: новые строки
+    вставляются через bulk_create, измененные обновляются через bulk_update,
+    а пропавшие из прайс-листа снимаются с продажи. Число запросов растет
+    с числом пачек, а не строк.
+    """
+
+    def __init__(self, shop, batch_size=None, progress=None, import_id=None):
+        self.shop = shop
+        # общий для всех частей одного импорта ключ подготовленных изменений
+        self.import_id = import_id or uuid4().hex
+        self.batch_size = batch_size or getattr(settings, 'IMPORT_BATCH_SIZE', 1000)
+        # ImportProgress фоновой задачи, получает число записанных позиций после каждой пачки
+        self.progress = progress
+        # название параметра -> id параметра, дополняется из общего словаря parameter_ids
+        self.parameters = {}
+        self.categories_processed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.removed = 0
+
+    def import_categories(self, categories):
+        """
+        Создает недостающие категории и привязывает их к магазину
+        """
+        categories = {category['id']: category['name'] for category in categories}
+        category_ids.get_ids(categories, {category_id: {'name': name} for category_id, name in categories.items()})
+        self.shop.categories.add(*categories)
+        self.categories_processed += len(categories)
+
+    def import_goods(self, goods):
+        """
+        Сопоставляет позиции прайс-листа с каталогом магазина пачками
+        """
+        for batch in batches(goods, self.batch_size):
+            self.stage_batch(self.prepare_batch(batch))
+
+    def prepare_batch(self, batch):
+        """
+        Находит или создает товары и параметры пачки
+
+        Возвращает позиции с добавленным product_id и значениями параметров,
+        приведенными к строкам, - в таком виде их принимает stage_batch.
+        """
+        products = self._resolve_products(batch)
+        self._resolve_parameters(batch)
+        return [dict(item,
+                     product_id=products[(item['name'], item['category'])],
+                     parameters={name: str(value) for name, value in item.get('parameters', {}).items()})
+                for item in batch]
+
+    def add_result(self, result):
+        """
+        Добавляет к счетчикам результат импорта части прайс-листа
+        """
+        self.inserted += result['inserted']
+        self.updated += result['updated']
+        self.unchanged += result['unchanged']
+
+    def retire_missing(self):
+        """
+        Снимает с продажи позиции, которых нет в прайс-листе
+
+        Строки не удаляются, чтобы не каскадировать удаление в OrderItem.
+        Позиции прайс-листа берутся из StagedExternalId, куда их записал stage_batch.
+        Возвращает id товаров снятых позиций.
+        """
+        seen = StagedExternalId.objects.filter(import_id=self.import_id, external_id=OuterRef('external_id'))
+        stale, product_ids = [], set()
+        for product_info_id, product_id in ProductInfo.objects.filter(shop_id=self.shop.id, is_active=True).filter(
+                ~Exists(seen)).values_list('id', 'product_id'):
+            stale.append(product_info_id)
+            product_ids.add(product_id)
+        for start in range(0, len(stale), self.batch_size):
+            ProductInfo.objects.filter(id__in=stale[start:start + self.batch_size]).update(
+                is_active=False, quantity=0)
+        unindex_products(stale)
+        remove_catalog_entries(stale)
+        self.removed += len(stale)
+        return product_ids
+
+    def result(self):
+        return {
+            'categories_processed': self.categories_processed,
+            'products_imported': self.inserted + self.updated + self.unchanged,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'removed': self.removed
+        }
+
+    def _resolve_products(self, batch):
+        """
+        Возвращает словарь (название, id категории) -> id товара для пачки
+
+        Один запрос на поиск и один на создание недостающих. Словарь живет
+        только в пределах пачки, чтобы память не росла с размером прайс-листа.
+        """
+        keys = {(item['name'], item['category']) for item in batch}
+        products = {}
+
+        found = Product.objects.filter(
+            name__in={name for name, _ in keys},
+            category_id__in={category_id for _, category_id in keys}).order_by('-id').values_list(
+            'name', 'category_id', 'id')
+        for name, category_id, product_id in found:
+            if (name, category_id) in keys:
+                products[(name, category_id)] = product_id
+
+        missing = [Product(name=name, category_id=category_id)
+                   for name, category_id in keys if (name, category_id) not in products]
+        for product in Product.objects.bulk_create(missing):
+            products[(product.name, product.category_id)] = product.id
+        return products
+
+    def _resolve_parameters(self, batch):
+        """
+        Дополняет словарь параметров названиями из пачки
+
+        Известные процессу названия берутся из parameter_ids без запросов к базе.
+        """
+        names = {name for item in batch for name in item.get('parameters', {})} - self.parameters.keys()
+        if names:
+            self.parameters.update(parameter_ids.get_ids(names, {name: {'unit': parameter_unit(name)}
+                                                                 for name in names}))
+
+    def stage_batch(self, batch):
+        """
+        Складывает отличия подготовленной пачки от каталога магазина в StagedProductInfo
+
+        Каталог магазина здесь только читается, покупатели продолжают видеть
+        прежнюю версию до вызова finish.
+        """
+        self._resolve_parameters(batch)
+        # при повторе external_id в прайс-листе побеждает последняя позиция
+        items = {item['id']: item for item in batch}
+        StagedExternalId.objects.bulk_create([StagedExternalId(import_id=self.import_id, external_id=external_id)
+                                              for external_id in items])
+
+        existing = {product_info.external_id: product_info for product_info in ProductInfo.objects.filter(
+            shop_id=self.shop.id, external_id__in=items).only(
+            'id', 'external_id', 'parameters', *PRODUCT_INFO_FIELDS)}
+
+        staged = []
+        for external_id, item in items.items():
+            values = {field: item[field] for field in STAGED_FIELDS}
+            parameters = {self.parameters[name]: value for name, value in item['parameters'].items()}
+
+            product_info = existing.get(external_id)
+            if product_info is None:
+                staged.append(StagedProductInfo(import_id=self.import_id, shop_id=self.shop.id,
+                                                external_id=external_id, parameters=parameters, **values))
+                self.inserted += 1
+                continue
+
+            fields_differ = not product_info.is_active or any(
+                getattr(product_info, field) != value for field, value in values.items())
+            parameters_differ = item['parameters'] != {
+                parameter['parameter']: parameter['value'] for parameter in product_info.parameters}
+            if fields_differ or parameters_differ:
+                staged.append(StagedProductInfo(import_id=self.import_id, shop_id=self.shop.id,
+                                                product_info_id=product_info.id, external_id=external_id,
+                                                fields_changed=fields_differ,
+                                                parameters=parameters if parameters_differ else None, **values))
+                self.updated += 1
+            else:
+                self.unchanged += 1
+
+        StagedProductInfo.objects.bulk_create(staged, batch_size=self.batch_size)
+        if self.progress is not None:
+            self.progress.advance(len(batch))
+
+    def finish(self, **shop_updates):
+        """
+        Делает подготовленную версию каталога видимой одной транзакцией
+
+        Подготовленные позиции переносятся в ProductInfo пачками по batch_size, затем
+        снимаются с продажи пропавшие, обновляются поисковый индекс, CatalogEntry,
+        ProductFacet и ProductPriceStats и увеличивается Shop.catalog_version.
+        shop_updates сохраняются в магазин в той же транзакции. Пока она не зафиксирована,
+        покупатели видят прежнюю версию каталога, а при ошибке она и остается.
+        """
+        staged = StagedProductInfo.objects.filter(import_id=self.import_id)
+        with transaction.atomic(), bulk_catalog_update():
+            product_ids = set()
+            last_id = 0
+            while rows := list(staged.filter(id__gt=last_id).order_by('id')[:self.batch_size]):
+                product_info_ids = self._apply_rows(rows)
+                # товар позиции мог смениться, поэтому цены пересчитываются и для прежнего
+                product_ids.update(CatalogEntry.objects.filter(product_info_id__in=product_info_ids).values_list(
+                    'product_id', flat=True).order_by())
+                product_ids.update(row.product_id for row in rows)
+                index_products(product_info_ids)
+                refresh_catalog_entries(product_info_ids)
+                last_id = rows[-1].id
+            product_ids |= self.retire_missing()
+            rebuild_facets(self.shop.id)
+            refresh_price_stats(product_ids)
+            staged.delete()
+            StagedExternalId.objects.filter(import_id=self.import_id).delete()
+            Shop.objects.filter(id=self.shop.id).update(catalog_version=F('catalog_version') + 1, **shop_updates)
+            bump_catalog_version(self.shop.id)
+            bump_autocomplete_version()
+
+    def discard(self):
+        """
+        Удаляет подготовленные изменения неудавшегося импорта
+
+        Созданные им категории остаются, поэтому версия каталога все равно меняется.
+        """
+        StagedProductInfo.objects.filter(import_id=self.import_id).delete()
+        StagedExternalId.objects.filter(import_id=self.import_id).delete()
+        bump_catalog_version()
+
+    def _apply_rows(self, rows):
+        """
+        Переносит пачку StagedProductInfo в каталог
+
+        Возвращает id новых и измененных позиций для поискового индекса и витрины.
+        """
+        # ключи JSON приходят строками; названия берутся из словаря импорта, в базу - только за недостающими,
+        # если apply выполняется не тем процессом, что готовил пачки
+        names = {parameter_id: name for name, parameter_id in self.parameters.items()}
+        missing = {int(parameter_id) for row in rows for parameter_id in row.parameters or {}} - names.keys()
+        if missing:
+            names.update(Parameter.objects.filter(id__in=missing).values_list('id', 'name'))
+
+        created, changed, parameters_changed = [], [], []
+        for row in rows:
+            values = {field: getattr(row, field) for field in STAGED_FIELDS}
+            if row.parameters is not None:
+                values['parameters'] = [{'parameter': names[int(parameter_id)], 'value': value}
+                                        for parameter_id, value in row.parameters.items()]
+            if row.product_info_id is None:
+                product_info = ProductInfo(external_id=row.external_id, shop_id=self.shop.id, **values)
+                created.append((product_info, row.parameters))
+                continue
+            product_info = ProductInfo(id=row.product_info_id, is_active=True, **values)
+            if row.fields_changed:
+                changed.append(product_info)
+            if row.parameters is not None:
+                parameters_changed.append((product_info, row.parameters))
+
+        if created:
+            ProductInfo.objects.bulk_create([product_info for product_info, _ in created])
+        if changed:
+            ProductInfo.objects.bulk_update(changed, PRODUCT_INFO_FIELDS, batch_size=self.batch_size)
+        if parameters_changed:
+            ProductInfo.objects.bulk_update([product_info for product_info, _ in parameters_changed], ['parameters'],
+                                            batch_size=self.batch_size)
+            ProductParameter.objects.filter(
+                product_info__in=[product_info for product_info, _ in parameters_changed]).delete()
+
+        ProductParameter.objects.bulk_create([
+            ProductParameter(product_info_id=product_info.id, parameter_id=int(parameter_id), value=value,
+                             value_number=parse_number(value, parameter_unit(names[int(parameter_id)])))
+            for product_info, parameters in created + parameters_changed
+            for parameter_id, value in parameters.items()], batch_size=self.batch_size)
+
+        return [product_info.id for product_info, _ in created] + list(
+            {product_info.id for product_info in changed} |
+            {product_info.id for product_info, _ in parameters_changed})
+
+
+def batches(iterable, size):
+    """
+    Разбивает поток на списки длиной size
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# name - имя файла части в price_list_storage, size - число позиций в ней
+PriceListChunk = namedtuple('PriceListChunk', ('name', 'size'))
+
+
+def write_chunks(importer, goods, name_prefix):
+    """
+    Раскладывает позиции прайс-листа по файлам-частям для параллельного импорта
+
+    Товары и параметры создаются здесь, последовательно, поэтому задачи-части
+    только сравнивают позиции с ProductInfo. Возвращает список PriceListChunk.
+    """
+    storage = price_list_storage()
+    chunk_size = getattr(settings, 'IMPORT_CHUNK_SIZE', 10000)
+    chunks = []
+    try:
+        for number, chunk in enumerate(batches(goods, chunk_size)):
+            prepared = []
+            for batch in batches(chunk, importer.batch_size):
+                prepared.extend(importer.prepare_batch(batch))
+            name = storage.save(f'{name_prefix}.part{number}.json', ContentFile(dump_json(prepared)))
+            chunks.append(PriceListChunk(name, len(prepared)))
+    except Exception:
+        # уже записанные части не достанутся ни одной задаче
+        for chunk in chunks:
+            storage.delete(chunk.name)
+        raise
+    return chunks
+
+
+def import_data(user, data, **shop_updates):
+    """
+    Общая функция импорта данных
+
+    Новая версия каталога готовится в StagedProductInfo и становится видна
+    покупателям целиком в конце. При ошибке остается прежняя версия.
+    """
+    shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=user.id)
+
+    importer = CatalogImporter(shop)
+    try:
+        importer.import_categories(data['categories'])
+        importer.import_goods(data['goods'])
+        importer.finish(**shop_updates)
+    except Exception:
+        importer.discard()
+        raise
+
+    return importer.result()
+
+
+def import_file(user, file):
+    """
+    Импорт прайс-листа из файла
+
+    Если содержимое совпадает с последним успешно импортированным прайс-листом
+    магазина, таблицы каталога не трогаются и возвращается {'feed_unchanged': True}.
+    """
+    digest = file_digest(file)
+    if is_imported(user, digest):
+        return {'feed_unchanged': True}
+
+    return import_data(user, load_price_list(file), feed_digest=digest)
+
+
+def is_imported(user, digest):
+    """
+    Проверяет, что прайс-лист с таким хэшем уже импортирован магазином
+    """
+    return Shop.objects.filter(user_id=user.id, feed_digest=digest).exists()
+
+
+def fetch_shop_price_list(user, url):
+    """
+    Скачивает прайс-лист магазина условным запросом по сохраненным ETag/Last-Modified
+    """
+    shop = Shop.objects.filter(user_id=user.id, url=url).first()
+    return fetch_price_list(url,
+                            shop.url_etag if shop else '',
+                            shop.url_last_modified if shop else '')
+
+
+def import_from_url(user, url):
+    """
+    Импорт прайс-листа по URL
+
+    Если прайс-лист не изменился с прошлой загрузки (ответ 304 или тот же хэш),
+    импорт пропускается и возвращается {'feed_unchanged': True}.
+    """
+    price_list = fetch_shop_price_list(user, url)
+    if price_list.name is None:
+        return {'feed_unchanged': True}
+
+    storage = price_list_storage()
+    try:
+        with storage.open(price_list.name, 'rb') as file:
+            result = import_file(user, file)
+    finally:
+        storage.delete(price_list.name)
+
+    Shop.objects.filter(user_id=user.id).update(url=url,
+                                                url_etag=price_list.etag,
+                                                url_last_modified=price_list.last_modified)
+    return result
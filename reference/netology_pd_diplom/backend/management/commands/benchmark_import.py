@@ -0,0 +1,77 @@
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from ujson import dump as dump_json, load as load_json
+
+from backend.benchmark import benchmark_import, generate_price_list, parse_size
+from backend.models import ProductInfo, User
+from backend.search import unindex_products
+
+
+class Command(BaseCommand):
+    help = ('Замеряет импорт синтетических прайс-листов: время, число запросов, пиковый RSS и строки в секунду. '
+            'Пишет в базу из настроек, запускать на отдельной базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('sizes', nargs='*', default=['1k', '10k'], help='Размеры прайс-листов: 1k 10k 100k 1M')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', help='Сохранить результаты в JSON-файл')
+        parser.add_argument('--baseline', help='JSON-файл прошлого прогона для поиска регрессий')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Допустимый рост времени и числа запросов относительно baseline (0.2 = 20%%)')
+        parser.add_argument('--keep', action='store_true', help='Не удалять магазины после замеров')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [parse_size(size) for size in options['sizes']]
+        except ValueError:
+            raise CommandError(f'Неверные размеры: {" ".join(options["sizes"])}')
+
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            for size in sizes:
+                path = os.path.join(directory, f'price_list_{size}.yaml')
+                with open(path, 'w', encoding='utf-8') as stream:
+                    generate_price_list(stream, size, options['seed'])
+
+                user = User.objects.create_user(email=f'benchmark-{size}-{options["seed"]}@example.com',
+                                                type='shop', is_active=True)
+                try:
+                    # первый импорт вставляет все позиции, повторный проверяет путь без изменений
+                    for scenario in ('initial', 'repeat'):
+                        metrics = benchmark_import(user, path)
+                        metrics.pop('result')
+                        results.append(dict(size=size, scenario=scenario, **metrics))
+                        self.stdout.write('{size:>9} {scenario:<8} {wall_time:>9.3f} s {queries:>8} queries '
+                                          '{rows_per_second:>11} rows/s {peak_rss_mb:>8} MB'.format(**results[-1]))
+                finally:
+                    if not options['keep']:
+                        # строки поискового индекса не связаны с ProductInfo внешним ключом и каскадом не удаляются
+                        unindex_products(ProductInfo.objects.filter(shop__user=user).values_list('id', flat=True))
+                        user.delete()
+
+        if options['json']:
+            with open(options['json'], 'w') as file:
+                dump_json(results, file, indent=2)
+
+        if options['baseline']:
+            self.check_regressions(results, options['baseline'], options['tolerance'])
+
+    def check_regressions(self, results, baseline_path, tolerance):
+        with open(baseline_path) as file:
+            baseline = {(item['size'], item['scenario']): item for item in load_json(file)}
+
+        regressions = []
+        for item in results:
+            previous = baseline.get((item['size'], item['scenario']))
+            if previous is None:
+                continue
+            for metric in ('wall_time', 'queries'):
+                if item[metric] > previous[metric] * (1 + tolerance):
+                    regressions.append(f'{item["size"]} {item["scenario"]}: {metric} '
+                                       f'{previous[metric]} -> {item[metric]}')
+
+        if regressions:
+            raise CommandError('Регрессии импорта:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий относительно baseline нет'))
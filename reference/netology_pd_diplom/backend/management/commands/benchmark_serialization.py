@@ -0,0 +1,45 @@
+from io import StringIO
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from backend.benchmark import benchmark_serialization, create_orders, generate_price_list, parse_size
+from backend.importer import import_data
+from backend.models import User
+from backend.price_list import load_price_list
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает сериализаторы DRF и быстрый путь на списке товаров и заказов: время на 1000 строк '
+            'и совпадение ответов. Данные создаются в транзакции, которая откатывается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('size', nargs='?', default='1k', help='Число позиций каталога и заказанных позиций')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=5, help='Число повторов, берется лучшее время')
+
+    def handle(self, *args, **options):
+        try:
+            size = parse_size(options['size'])
+        except ValueError:
+            raise CommandError(f'Неверное число позиций: {options["size"]}')
+
+        with transaction.atomic():
+            stream = StringIO()
+            generate_price_list(stream, size, options['seed'])
+            stream.seek(0)
+            shop_user = User.objects.create_user(email='benchmark-serialization-shop@example.com', type='shop',
+                                                 is_active=True)
+            import_data(shop_user, load_price_list(stream))
+            create_orders(User.objects.create_user(email='benchmark-serialization-buyer@example.com',
+                                                   is_active=True))
+
+            results = benchmark_serialization(options['repeat'])
+            transaction.set_rollback(True)
+
+        for result in results:
+            self.stdout.write('{listing:<8} {rows:>8} rows {serializer_ms_per_1k:>9} ms/1k (DRF) '
+                              '{fast_ms_per_1k:>9} ms/1k (fast) x{speedup}'.format(**result))
+        different = [result['listing'] for result in results if not result['identical']]
+        if different:
+            raise CommandError(f'Быстрый путь расходится с сериализаторами DRF: {", ".join(different)}')
@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.benchmark import generate_price_list, parse_size
+
+
+class Command(BaseCommand):
+    help = 'Генерирует синтетический прайс-лист формата data/shop1.yaml'
+
+    def add_arguments(self, parser):
+        parser.add_argument('size', help='Число позиций: 1000, 10k, 1M')
+        parser.add_argument('-o', '--output', help='Файл для прайс-листа, по умолчанию stdout')
+        parser.add_argument('--seed', type=int, default=0, help='Одинаковый seed дает одинаковый прайс-лист')
+
+    def handle(self, *args, **options):
+        try:
+            goods_count = parse_size(options['size'])
+        except ValueError:
+            raise CommandError(f'Неверное число позиций: {options["size"]}')
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                generate_price_list(stream, goods_count, options['seed'])
+            self.stderr.write(f'{options["output"]}: {goods_count} позиций')
+        else:
+            generate_price_list(sys.stdout, goods_count, options['seed'])
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.models import Parameter, ProductParameter
+from backend.parameters import parameter_unit, parse_number
+
+
+class Command(BaseCommand):
+    help = 'Заполняет единицы измерения параметров и числовые значения для каталогов, загруженных раньше'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            parameters = list(Parameter.objects.only('id', 'name', 'unit'))
+            for parameter in parameters:
+                parameter.unit = parameter_unit(parameter.name)
+            Parameter.objects.bulk_update(parameters, ['unit'], batch_size=options['batch_size'])
+
+            units = {parameter.id: parameter.unit for parameter in parameters}
+            updated, last_id = 0, 0
+            while True:
+                rows = list(ProductParameter.objects.filter(id__gt=last_id).order_by('id').only(
+                    'id', 'parameter_id', 'value', 'value_number')[:options['batch_size']])
+                if not rows:
+                    break
+                for row in rows:
+                    row.value_number = parse_number(row.value, units[row.parameter_id])
+                ProductParameter.objects.bulk_update(rows, ['value_number'])
+                updated += len(rows)
+                last_id = rows[-1].id
+        self.stdout.write(self.style.SUCCESS(f'Параметров: {len(parameters)}, значений: {updated}'))
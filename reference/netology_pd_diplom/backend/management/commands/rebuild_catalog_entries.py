@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.catalog import bump_catalog_version, refresh_catalog_entries, refresh_parameter_documents
+from backend.models import CatalogEntry, ProductInfo, Shop
+
+
+class Command(BaseCommand):
+    help = 'Заново строит ProductInfo.parameters и витрину каталога (CatalogEntry) по активным позициям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ids = list(ProductInfo.objects.filter(is_active=True).order_by('id').values_list('id', flat=True))
+        with transaction.atomic():
+            CatalogEntry.objects.all().delete()
+            for start in range(0, len(ids), options['batch_size']):
+                refresh_parameter_documents(ids[start:start + options['batch_size']])
+                refresh_catalog_entries(ids[start:start + options['batch_size']])
+            bump_catalog_version(*Shop.objects.values_list('id', flat=True))
+        self.stdout.write(self.style.SUCCESS(f'Позиций в витрине: {len(ids)}'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.facets import rebuild_facets
+from backend.models import Shop
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики фильтров каталога (ProductFacet) для всех магазинов'
+
+    def handle(self, *args, **options):
+        for shop_id in Shop.objects.values_list('id', flat=True):
+            with transaction.atomic():
+                rebuild_facets(shop_id)
+        self.stdout.write(self.style.SUCCESS('Счетчики фильтров пересчитаны'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.models import CatalogEntry, ProductPriceStats
+from backend.prices import refresh_price_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сравнение цен (ProductPriceStats) для всех товаров витрины'
+
+    def handle(self, *args, **options):
+        product_ids = set(CatalogEntry.objects.values_list('product_id', flat=True).order_by())
+        with transaction.atomic():
+            ProductPriceStats.objects.exclude(product_id__in=product_ids).delete()
+            refresh_price_stats(product_ids)
+        self.stdout.write(self.style.SUCCESS(f'Товаров с ценами: {ProductPriceStats.objects.count()}'))
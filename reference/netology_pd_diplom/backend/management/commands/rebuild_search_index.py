@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from backend.models import ProductInfo
+from backend.search import SEARCH_TABLE, index_products
+
+
+class Command(BaseCommand):
+    help = 'Заново строит поисковый индекс каталога по активным позициям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ids = list(ProductInfo.objects.filter(is_active=True).order_by('id').values_list('id', flat=True))
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            for start in range(0, len(ids), options['batch_size']):
+                index_products(ids[start:start + options['batch_size']])
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано позиций: {len(ids)}'))
@@ -0,0 +1,224 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogEntry',
+            fields=[
+                ('product_info', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='catalog_entry', serialize=False, to='backend.productinfo', verbose_name='Информация о продукте')),
+                ('shop_state', models.BooleanField(verbose_name='статус получения заказов')),
+                ('product_name', models.CharField(max_length=80, verbose_name='Название продукта')),
+                ('category_name', models.CharField(max_length=40, verbose_name='Название категории')),
+                ('model', models.CharField(blank=True, max_length=80, verbose_name='Модель')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('price', models.PositiveIntegerField(verbose_name='Цена')),
+                ('price_rrc', models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')),
+                ('parameters', models.JSONField(default=list, verbose_name='Параметры')),
+            ],
+            options={
+                'verbose_name': 'Позиция витрины',
+                'verbose_name_plural': 'Витрина каталога',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(blank=True, max_length=100, verbose_name='Значение')),
+                ('count', models.PositiveIntegerField(verbose_name='Количество позиций')),
+                ('in_stock', models.PositiveIntegerField(verbose_name='Количество позиций в наличии')),
+            ],
+            options={
+                'verbose_name': 'Счетчик фильтра',
+                'verbose_name_plural': 'Счетчики фильтров',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductPriceStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='price_stats', serialize=False, to='backend.product', verbose_name='Продукт')),
+                ('offers', models.PositiveIntegerField(verbose_name='Количество предложений')),
+                ('min_price', models.PositiveIntegerField(verbose_name='Минимальная цена')),
+                ('max_price', models.PositiveIntegerField(verbose_name='Максимальная цена')),
+                ('median_price', models.FloatField(verbose_name='Медианная цена')),
+            ],
+            options={
+                'verbose_name': 'Цены товара',
+                'verbose_name_plural': 'Сравнение цен',
+            },
+        ),
+        migrations.CreateModel(
+            name='StagedExternalId',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('import_id', models.CharField(max_length=32, verbose_name='ИД импорта')),
+                ('external_id', models.PositiveIntegerField(verbose_name='Внешний ИД')),
+            ],
+            options={
+                'verbose_name': 'Позиция прайс-листа импорта',
+                'verbose_name_plural': 'Позиции прайс-листа импорта',
+            },
+        ),
+        migrations.CreateModel(
+            name='StagedProductInfo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('import_id', models.CharField(db_index=True, max_length=32, verbose_name='ИД импорта')),
+                ('external_id', models.PositiveIntegerField(verbose_name='Внешний ИД')),
+                ('model', models.CharField(blank=True, max_length=80, verbose_name='Модель')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('price', models.PositiveIntegerField(verbose_name='Цена')),
+                ('price_rrc', models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')),
+                ('fields_changed', models.BooleanField(default=True, verbose_name='Изменены поля')),
+                ('parameters', models.JSONField(blank=True, null=True, verbose_name='Параметры')),
+            ],
+            options={
+                'verbose_name': 'Подготовленная позиция импорта',
+                'verbose_name_plural': 'Подготовленные позиции импорта',
+            },
+        ),
+        migrations.AddField(
+            model_name='parameter',
+            name='unit',
+            field=models.CharField(blank=True, max_length=20, verbose_name='Единица измерения'),
+        ),
+        migrations.AddField(
+            model_name='productinfo',
+            name='is_active',
+            field=models.BooleanField(default=True, verbose_name='Есть в прайс-листе'),
+        ),
+        migrations.AddField(
+            model_name='productinfo',
+            name='parameters',
+            field=models.JSONField(default=list, verbose_name='Параметры'),
+        ),
+        migrations.AddField(
+            model_name='productparameter',
+            name='value_number',
+            field=models.FloatField(blank=True, null=True, verbose_name='Числовое значение'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='catalog_version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия каталога'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='feed_digest',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Хэш прайс-листа'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='url_etag',
+            field=models.CharField(blank=True, max_length=200, verbose_name='ETag прайс-листа'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='url_last_modified',
+            field=models.CharField(blank=True, max_length=50, verbose_name='Last-Modified прайс-листа'),
+        ),
+        migrations.AlterField(
+            model_name='parameter',
+            name='name',
+            field=models.CharField(max_length=40, unique=True, verbose_name='Название'),
+        ),
+        migrations.AddIndex(
+            model_name='productinfo',
+            index=models.Index(fields=['shop', 'external_id'], name='product_info_shop_external'),
+        ),
+        migrations.AddIndex(
+            model_name='productinfo',
+            index=models.Index(fields=['price'], name='product_info_price'),
+        ),
+        migrations.AddIndex(
+            model_name='productinfo',
+            index=models.Index(fields=['price_rrc'], name='product_info_price_rrc'),
+        ),
+        migrations.AddIndex(
+            model_name='productparameter',
+            index=models.Index(fields=['parameter', 'value', 'product_info'], name='product_parameter_value'),
+        ),
+        migrations.AddIndex(
+            model_name='productparameter',
+            index=models.Index(fields=['parameter', 'value_number', 'product_info'], name='product_parameter_number'),
+        ),
+        migrations.AddField(
+            model_name='catalogentry',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.category', verbose_name='Категория'),
+        ),
+        migrations.AddField(
+            model_name='catalogentry',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.product', verbose_name='Продукт'),
+        ),
+        migrations.AddField(
+            model_name='catalogentry',
+            name='shop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.shop', verbose_name='Магазин'),
+        ),
+        migrations.AddField(
+            model_name='productfacet',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.category', verbose_name='Категория'),
+        ),
+        migrations.AddField(
+            model_name='productfacet',
+            name='parameter',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.parameter', verbose_name='Параметр'),
+        ),
+        migrations.AddField(
+            model_name='productfacet',
+            name='shop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.shop', verbose_name='Магазин'),
+        ),
+        migrations.AddField(
+            model_name='productpricestats',
+            name='best_offer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.productinfo', verbose_name='Лучшее предложение'),
+        ),
+        migrations.AddIndex(
+            model_name='stagedexternalid',
+            index=models.Index(fields=['import_id', 'external_id'], name='staged_external_id_import'),
+        ),
+        migrations.AddField(
+            model_name='stagedproductinfo',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.product', verbose_name='Продукт'),
+        ),
+        migrations.AddField(
+            model_name='stagedproductinfo',
+            name='product_info',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.productinfo', verbose_name='Информация о продукте'),
+        ),
+        migrations.AddField(
+            model_name='stagedproductinfo',
+            name='shop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='backend.shop', verbose_name='Магазин'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogentry',
+            index=models.Index(fields=['shop_state', 'product_info'], name='catalog_entry_state'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogentry',
+            index=models.Index(fields=['price'], name='catalog_entry_price'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogentry',
+            index=models.Index(fields=['price_rrc'], name='catalog_entry_price_rrc'),
+        ),
+        migrations.AddIndex(
+            model_name='productfacet',
+            index=models.Index(fields=['category', 'parameter'], name='product_facet_category'),
+        ),
+    ]
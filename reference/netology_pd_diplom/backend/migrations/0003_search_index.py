@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# таблица поискового индекса backend.search: FTS5 в SQLite, tsvector с GIN-индексом в PostgreSQL
+SEARCH_TABLE = 'backend_product_search'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} '
+                              f'(product_info_id bigint PRIMARY KEY, document tsvector NOT NULL)')
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document '
+                              f'ON {SEARCH_TABLE} USING GIN (document)')
+    else:
+        # в индекс пишутся основы слов, rowid - id позиции каталога
+        schema_editor.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} '
+                              f"USING fts5(document, tokenize='unicode61 remove_diacritics 0')")
+
+
+def drop_search_index(apps, schema_editor):
+    schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+    """
+    Таблица поискового индекса каталога
+
+    Ее нет среди моделей, поэтому она создается отдельной миграцией под СУБД проекта.
+    """
+
+    dependencies = [
+        ('backend', '0002_catalog_read_model'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
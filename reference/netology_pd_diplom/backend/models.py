@@ -124,6 +124,13 @@ class Shop(models.Model):
                                 blank=True, null=True,
                                 on_delete=models.CASCADE)
     state = models.BooleanField(verbose_name='статус получения заказов', default=True)
+    # валидаторы последнего скачанного по url прайс-листа для условных запросов
+    url_etag = models.CharField(verbose_name='ETag прайс-листа', max_length=200, blank=True)
+    url_last_modified = models.CharField(verbose_name='Last-Modified прайс-листа', max_length=50, blank=True)
+    # SHA-256 последнего успешно импортированного прайс-листа
+    feed_digest = models.CharField(verbose_name='Хэш прайс-листа', max_length=64, blank=True)
+    # увеличивается при каждом применении импорта, когда покупателям становится видна новая версия каталога
+    catalog_version = models.PositiveIntegerField(verbose_name='Версия каталога', default=0)
 
     # filename
 
@@ -176,6 +183,10 @@ class ProductInfo(models.Model):
     quantity = models.PositiveIntegerField(verbose_name='Количество')
     price = models.PositiveIntegerField(verbose_name='Цена')
     price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    is_active = models.BooleanField(verbose_name='Есть в прайс-листе', default=True)
+    # копия product_parameters списком {"parameter", "value"}, которую ведет импорт;
+    # чтение каталога обходится без ProductParameter, он нужен фильтрам
+    parameters = models.JSONField(verbose_name='Параметры', default=list)
 
     class Meta:
         verbose_name = 'Информация о продукте'
@@ -183,11 +194,65 @@ class ProductInfo(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['product', 'shop', 'external_id'], name='unique_product_info'),
         ]
+        indexes = [
+            models.Index(fields=['shop', 'external_id'], name='product_info_shop_external'),
+            # фильтры каталога по диапазонам цен
+            models.Index(fields=['price'], name='product_info_price'),
+            models.Index(fields=['price_rrc'], name='product_info_price_rrc'),
+        ]
+
+
+class StagedProductInfo(models.Model):
+    """
+    Изменение позиции каталога, подготовленное импортом и еще не видимое покупателям
+
+    Импорт складывает сюда новые и измененные позиции, а затем применяет их
+    к ProductInfo одной транзакцией.
+    """
+    objects = models.manager.Manager()
+    import_id = models.CharField(verbose_name='ИД импорта', max_length=32, db_index=True)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='+', on_delete=models.CASCADE)
+    # пусто для новой позиции
+    product_info = models.ForeignKey(ProductInfo, verbose_name='Информация о продукте', related_name='+',
+                                     null=True, blank=True, on_delete=models.CASCADE)
+    external_id = models.PositiveIntegerField(verbose_name='Внешний ИД')
+    product = models.ForeignKey(Product, verbose_name='Продукт', related_name='+', on_delete=models.CASCADE)
+    model = models.CharField(max_length=80, verbose_name='Модель', blank=True)
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    fields_changed = models.BooleanField(verbose_name='Изменены поля', default=True)
+    # id параметра -> значение; пусто, если параметры не изменились
+    parameters = models.JSONField(verbose_name='Параметры', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Подготовленная позиция импорта'
+        verbose_name_plural = "Подготовленные позиции импорта"
+
+
+class StagedExternalId(models.Model):
+    """
+    Внешний ИД позиции, которая есть в прайс-листе импорта
+
+    Части прайс-листа импортируются разными задачами, поэтому список позиций
+    хранится здесь, а не в памяти: по нему завершение импорта находит пропавшие.
+    """
+    objects = models.manager.Manager()
+    import_id = models.CharField(verbose_name='ИД импорта', max_length=32)
+    external_id = models.PositiveIntegerField(verbose_name='Внешний ИД')
+
+    class Meta:
+        verbose_name = 'Позиция прайс-листа импорта'
+        verbose_name_plural = "Позиции прайс-листа импорта"
+        indexes = [
+            models.Index(fields=['import_id', 'external_id'], name='staged_external_id_import'),
+        ]
 
 
 class Parameter(models.Model):
     objects = models.manager.Manager()
-    name = models.CharField(max_length=40, verbose_name='Название')
+    name = models.CharField(max_length=40, verbose_name='Название', unique=True)
+    unit = models.CharField(max_length=20, verbose_name='Единица измерения', blank=True)
 
     class Meta:
         verbose_name = 'Имя параметра'
@@ -206,6 +271,8 @@ class ProductParameter(models.Model):
     parameter = models.ForeignKey(Parameter, verbose_name='Параметр', related_name='product_parameters', blank=True,
                                   on_delete=models.CASCADE)
     value = models.CharField(verbose_name='Значение', max_length=100)
+    # value как число для фильтров по диапазону, None для нечисловых значений
+    value_number = models.FloatField(verbose_name='Числовое значение', null=True, blank=True)
 
     class Meta:
         verbose_name = 'Параметр'
@@ -213,6 +280,96 @@ class ProductParameter(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['product_info', 'parameter'], name='unique_product_parameter'),
         ]
+        indexes = [
+            # фильтр каталога по значению параметра читает только индекс
+            models.Index(fields=['parameter', 'value', 'product_info'], name='product_parameter_value'),
+            # фильтр по диапазону (>, >=, <, <=) - просмотр диапазона этого индекса
+            models.Index(fields=['parameter', 'value_number', 'product_info'], name='product_parameter_number'),
+        ]
+
+
+class ProductFacet(models.Model):
+    """
+    Число активных позиций магазина в категории и по значениям параметров
+
+    Пересчитывается для магазина при каждом применении импорта и отвечает
+    на запросы счетчиков фильтров без группировки по всему каталогу.
+    """
+    objects = models.manager.Manager()
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='+', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='+', on_delete=models.CASCADE)
+    # пусто для строки со всеми позициями категории
+    parameter = models.ForeignKey(Parameter, verbose_name='Параметр', related_name='+', null=True, blank=True,
+                                  on_delete=models.CASCADE)
+    value = models.CharField(verbose_name='Значение', max_length=100, blank=True)
+    count = models.PositiveIntegerField(verbose_name='Количество позиций')
+    in_stock = models.PositiveIntegerField(verbose_name='Количество позиций в наличии')
+
+    class Meta:
+        verbose_name = 'Счетчик фильтра'
+        verbose_name_plural = "Счетчики фильтров"
+        indexes = [
+            models.Index(fields=['category', 'parameter'], name='product_facet_category'),
+        ]
+
+
+class CatalogEntry(models.Model):
+    """
+    Позиция каталога в том виде, в котором ее отдает API
+
+    Одна строка на активную позицию: названия товара и категории, статус
+    магазина и параметры хранятся в самой строке, поэтому список товаров
+    читается из одной таблицы. Обновляется при применении импорта, заказах,
+    переключении статуса магазина и правке позиций в админке.
+    """
+    objects = models.manager.Manager()
+    product_info = models.OneToOneField(ProductInfo, verbose_name='Информация о продукте', primary_key=True,
+                                        related_name='catalog_entry', on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='+', on_delete=models.CASCADE)
+    shop_state = models.BooleanField(verbose_name='статус получения заказов')
+    product = models.ForeignKey(Product, verbose_name='Продукт', related_name='+', on_delete=models.CASCADE)
+    product_name = models.CharField(max_length=80, verbose_name='Название продукта')
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='+', on_delete=models.CASCADE)
+    category_name = models.CharField(max_length=40, verbose_name='Название категории')
+    model = models.CharField(max_length=80, verbose_name='Модель', blank=True)
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    # [{"parameter": название, "value": значение}, ...] в порядке прайс-листа
+    parameters = models.JSONField(verbose_name='Параметры', default=list)
+
+    class Meta:
+        verbose_name = 'Позиция витрины'
+        verbose_name_plural = "Витрина каталога"
+        indexes = [
+            models.Index(fields=['shop_state', 'product_info'], name='catalog_entry_state'),
+            models.Index(fields=['price'], name='catalog_entry_price'),
+            models.Index(fields=['price_rrc'], name='catalog_entry_price_rrc'),
+        ]
+
+
+class ProductPriceStats(models.Model):
+    """
+    Цены одного товара во всех магазинах
+
+    Считается по позициям витрины активных магазинов, которые есть в наличии.
+    Пересчитывается для товаров магазина при применении импорта и смене
+    его статуса, поэтому сравнение цен не группирует каталог на каждый запрос.
+    """
+    objects = models.manager.Manager()
+    product = models.OneToOneField(Product, verbose_name='Продукт', primary_key=True, related_name='price_stats',
+                                   on_delete=models.CASCADE)
+    offers = models.PositiveIntegerField(verbose_name='Количество предложений')
+    min_price = models.PositiveIntegerField(verbose_name='Минимальная цена')
+    max_price = models.PositiveIntegerField(verbose_name='Максимальная цена')
+    median_price = models.FloatField(verbose_name='Медианная цена')
+    # самое дешевое предложение, при равной цене - с большим остатком
+    best_offer = models.ForeignKey(ProductInfo, verbose_name='Лучшее предложение', related_name='+',
+                                   on_delete=models.CASCADE)
+
+    class Meta:
+        verbose_name = 'Цены товара'
+        verbose_name_plural = "Сравнение цен"
 
 
 class Contact(models.Model):
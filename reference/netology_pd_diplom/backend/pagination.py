@@ -0,0 +1,22 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Keyset-пагинация каталога по первичному ключу
+
+    Следующая страница выбирается условием pk > последнего pk предыдущей,
+    поэтому глубокие страницы стоят столько же, сколько первая. Курсор
+    непрозрачный, размер страницы задается page_size, но не больше max_page_size.
+    """
+    # pk, а не id: у CatalogEntry первичный ключ - product_info
+    ordering = 'pk'
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class SearchPagination(LimitOffsetPagination):
+    """
+    Пагинация результатов поиска, которые уже ограничены SEARCH_MAX_RESULTS и отсортированы по релевантности
+    """
+    max_limit = 200
@@ -0,0 +1,61 @@
+import re
+
+# единица измерения в конце названия параметра: "Диагональ (дюйм)", "Встроенная память (Гб)"
+UNIT = re.compile(r'\(([^()]+)\)\s*$')
+# число с необязательной единицей из букв: "6.5", "6,5", "256 Гб", "65in"; "3840x2160" числом не считается
+NUMBER = re.compile(r'^\s*(-?[0-9]+(?:[.,][0-9]+)?)\s*([^\W\d_]+\.?)?\s*$')
+# известные единицы: единица -> (величина, множитель к основной единице величины)
+UNITS = {
+    'б': ('bytes', 1), 'кб': ('bytes', 2 ** 10), 'мб': ('bytes', 2 ** 20), 'гб': ('bytes', 2 ** 30),
+    'тб': ('bytes', 2 ** 40),
+    'b': ('bytes', 1), 'kb': ('bytes', 2 ** 10), 'mb': ('bytes', 2 ** 20), 'gb': ('bytes', 2 ** 30),
+    'tb': ('bytes', 2 ** 40),
+    'мм': ('length', 0.001), 'см': ('length', 0.01), 'м': ('length', 1),
+    'mm': ('length', 0.001), 'cm': ('length', 0.01), 'm': ('length', 1),
+    'дюйм': ('length', 0.0254), 'in': ('length', 0.0254),
+    'г': ('weight', 0.001), 'кг': ('weight', 1), 'g': ('weight', 0.001), 'kg': ('weight', 1),
+    'гц': ('frequency', 1), 'кгц': ('frequency', 10 ** 3), 'мгц': ('frequency', 10 ** 6),
+    'ггц': ('frequency', 10 ** 9),
+    'hz': ('frequency', 1), 'khz': ('frequency', 10 ** 3), 'mhz': ('frequency', 10 ** 6),
+    'ghz': ('frequency', 10 ** 9),
+    'мач': ('charge', 1), 'mah': ('charge', 1),
+    'вт': ('power', 1), 'w': ('power', 1),
+}
+
+
+def parameter_unit(name):
+    """
+    Единица измерения из названия параметра или пустая строка
+    """
+    match = UNIT.search(name)
+    return match.group(1).strip() if match else ''
+
+
+def _normalize_unit(unit):
+    return unit.lower().replace('ё', 'е').rstrip('.').strip()
+
+
+def parse_number(value, unit=''):
+    """
+    Числовое значение параметра в единицах unit или None
+
+    unit - единица параметра (Parameter.unit). Число без единицы считается записанным
+    в unit, известные единицы переводятся в нее ("1 Тб" при unit "Гб" - 1024).
+    Если единицу значения нельзя перевести в unit, возвращается None, чтобы значение
+    не попало в диапазон рядом с числами в другой единице.
+    """
+    if isinstance(value, bool):
+        return None
+    match = NUMBER.match(str(value))
+    if not match:
+        return None
+    number = float(match.group(1).replace(',', '.'))
+    if not match.group(2):
+        return number
+
+    value_unit, unit = _normalize_unit(match.group(2)), _normalize_unit(unit)
+    if value_unit == unit:
+        return number
+    if value_unit in UNITS and unit in UNITS and UNITS[value_unit][0] == UNITS[unit][0]:
+        return number * UNITS[value_unit][1] / UNITS[unit][1]
+    return None
@@ -0,0 +1,202 @@
+import hashlib
+import os
+from collections import namedtuple
+from tempfile import NamedTemporaryFile
+from uuid import uuid4
+
+import requests
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from yaml.events import AliasEvent, ScalarEvent, SequenceStartEvent, SequenceEndEvent, MappingStartEvent, \
+    MappingEndEvent, StreamEndEvent
+from yaml.nodes import ScalarNode, SequenceNode, MappingNode
+
+try:
+    # C-парсер libyaml в разы быстрее чистого Python
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+def price_list_storage():
+    """
+    Хранилище загруженных прайс-листов, общее для веб-процесса и воркеров Celery
+    """
+    return FileSystemStorage(location=getattr(settings, 'PRICE_LIST_ROOT',
+                                              os.path.join(settings.BASE_DIR, 'price_lists')))
+
+
+def spool_price_list(file):
+    """
+    Сохраняет загруженный файл в хранилище по частям и возвращает его имя
+
+    В задачу Celery передается только имя файла, а не его содержимое.
+    """
+    return price_list_storage().save(f'{uuid4().hex}.yaml', file)
+
+
+def file_digest(file):
+    """
+    SHA-256 содержимого файла, после чтения файл перематывается в начало
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(64 * 1024), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+# name - имя файла в price_list_storage или None, если прайс-лист не изменился
+FetchedPriceList = namedtuple('FetchedPriceList', ('name', 'etag', 'last_modified'))
+
+
+def fetch_price_list(url, etag='', last_modified=''):
+    """
+    Скачивает прайс-лист по URL потоком в хранилище
+
+    Отправляет условный запрос по сохраненным ETag/Last-Modified: на ответ 304
+    файл не скачивается и возвращается name=None. Размер ограничен
+    PRICE_LIST_MAX_SIZE, время ожидания - PRICE_LIST_FETCH_TIMEOUT.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    max_size = getattr(settings, 'PRICE_LIST_MAX_SIZE', 100 * 1024 * 1024)
+    timeout = getattr(settings, 'PRICE_LIST_FETCH_TIMEOUT', 30)
+
+    with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return FetchedPriceList(None, etag, last_modified)
+        response.raise_for_status()
+        if int(response.headers.get('Content-Length') or 0) > max_size:
+            raise ValueError(f'Прайс-лист больше {max_size} байт')
+
+        storage = price_list_storage()
+        os.makedirs(storage.location, exist_ok=True)
+        with NamedTemporaryFile(dir=storage.location, suffix='.yaml', delete=False) as file:
+            try:
+                size = 0
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    size += len(chunk)
+                    if size > max_size:
+                        raise ValueError(f'Прайс-лист больше {max_size} байт')
+                    file.write(chunk)
+            except Exception:
+                file.close()
+                os.remove(file.name)
+                raise
+
+        return FetchedPriceList(os.path.basename(file.name),
+                                response.headers.get('ETag', ''),
+                                response.headers.get('Last-Modified', ''))
+
+
+def load_price_list(stream):
+    """
+    Потоково разбирает прайс-лист формата data/shop1.yaml
+
+    Возвращает словарь с ключами shop, categories и goods, где goods - генератор,
+    который разбирает позиции по одной по мере чтения. Разделы shop и categories
+    должны идти в документе до goods.
+    """
+    loader = SafeLoader(stream)
+    anchors = {}
+    data = {}
+
+    loader.get_event()  # StreamStartEvent
+    if loader.check_event(StreamEndEvent):
+        loader.dispose()
+        raise ValueError('Пустой прайс-лист')
+    loader.get_event()  # DocumentStartEvent
+    if not loader.check_event(MappingStartEvent):
+        loader.dispose()
+        raise ValueError('Неверный формат прайс-листа')
+    loader.get_event()
+
+    while not loader.check_event(MappingEndEvent):
+        key = loader.construct_document(_compose(loader, anchors))
+        if key == 'goods':
+            if 'shop' not in data or 'categories' not in data:
+                loader.dispose()
+                raise ValueError('Разделы shop и categories должны идти до goods')
+            data['goods'] = _iter_goods(loader, anchors)
+            return data
+        elif key == 'categories':
+            data['categories'] = list(_iter_sequence(loader, anchors))
+        else:
+            data[key] = loader.construct_document(_compose(loader, anchors))
+
+    loader.dispose()
+    data.setdefault('goods', iter(()))
+    return data
+
+
+def _iter_goods(loader, anchors):
+    """
+    Отдает позиции goods по одной и освобождает парсер в конце
+    """
+    try:
+        yield from _iter_sequence(loader, anchors)
+    finally:
+        loader.dispose()
+
+
+def _iter_sequence(loader, anchors):
+    """
+    Разбирает последовательность верхнего уровня по одному элементу
+    """
+    if not loader.check_event(SequenceStartEvent):
+        _compose(loader, anchors)
+        return
+    loader.get_event()
+    while not loader.check_event(SequenceEndEvent):
+        yield loader.construct_document(_compose(loader, anchors))
+    loader.get_event()
+
+
+def _compose(loader, anchors):
+    """
+    Собирает узел YAML из событий парсера
+
+    libyaml не дает собрать отдельный узел документа, поэтому узлы строятся
+    из событий здесь, а теги разрешаются и конструируются штатным загрузчиком.
+    """
+    event = loader.get_event()
+    if isinstance(event, AliasEvent):
+        return anchors[event.anchor]
+
+    if isinstance(event, ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(ScalarNode, event.value, event.implicit)
+        node = ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+        if event.anchor:
+            anchors[event.anchor] = node
+        return node
+
+    if isinstance(event, SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(SequenceNode, None, event.implicit)
+        node = SequenceNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+        if event.anchor:
+            anchors[event.anchor] = node
+        while not loader.check_event(SequenceEndEvent):
+            node.value.append(_compose(loader, anchors))
+        node.end_mark = loader.get_event().end_mark
+        return node
+
+    tag = event.tag
+    if tag is None or tag == '!':
+        tag = loader.resolve(MappingNode, None, event.implicit)
+    node = MappingNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+    if event.anchor:
+        anchors[event.anchor] = node
+    while not loader.check_event(MappingEndEvent):
+        key = _compose(loader, anchors)
+        node.value.append((key, _compose(loader, anchors)))
+    node.end_mark = loader.get_event().end_mark
+    return node
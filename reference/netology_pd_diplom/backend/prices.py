@@ -0,0 +1,38 @@
+from statistics import median
+
+from .models import CatalogEntry, ProductPriceStats
+
+# сколько товаров пересчитывается за раз: SQLite ограничивает число параметров в IN (...)
+STATS_BATCH_SIZE = 500
+
+
+def shop_product_ids(shop_ids):
+    """
+    id товаров, которые магазины выставляют в витрине
+    """
+    return set(CatalogEntry.objects.filter(shop_id__in=shop_ids).values_list('product_id', flat=True).order_by())
+
+
+def refresh_price_stats(product_ids):
+    """
+    Пересчитывает ProductPriceStats для товаров по id
+
+    Товары, у которых не осталось предложений в наличии у активных магазинов, из таблицы удаляются.
+    """
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), STATS_BATCH_SIZE):
+        batch = product_ids[start:start + STATS_BATCH_SIZE]
+        offers = {}
+        for offer in CatalogEntry.objects.filter(product_id__in=batch, shop_state=True, quantity__gt=0).values(
+                'product_id', 'product_info_id', 'price', 'quantity').order_by():
+            offers.setdefault(offer['product_id'], []).append(offer)
+
+        stats = []
+        for product_id, product_offers in offers.items():
+            prices = [offer['price'] for offer in product_offers]
+            best = min(product_offers, key=lambda offer: (offer['price'], -offer['quantity'], offer['product_info_id']))
+            stats.append(ProductPriceStats(product_id=product_id, offers=len(product_offers), min_price=min(prices),
+                                           max_price=max(prices), median_price=median(prices),
+                                           best_offer_id=best['product_info_id']))
+        ProductPriceStats.objects.filter(product_id__in=batch).delete()
+        ProductPriceStats.objects.bulk_create(stats)
@@ -0,0 +1,81 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class ImportProgress:
+    """
+    Прогресс фонового импорта прайс-листа в кэше
+
+    Состояние хранится под id задачи-координатора. Счетчик обработанных позиций
+    лежит отдельным ключом: задачи-части увеличивают его атомарно раз в пачку,
+    а не на каждую строку. user_id - владелец импорта, записывается в состояние
+    при его создании, чтобы отчет был доступен и для импорта, завершившегося сразу.
+    """
+
+    def __init__(self, task_id, user_id=None):
+        self.user_id = user_id
+        self.key = f'import_progress:{task_id}'
+        self.processed_key = f'{self.key}:processed'
+        self.timeout = getattr(settings, 'IMPORT_PROGRESS_TIMEOUT', 24 * 60 * 60)
+
+    def queue(self, user_id):
+        """
+        Регистрирует поставленную в очередь задачу; не затирает уже начатую
+        """
+        cache.add(self.key, {'user_id': user_id, 'phase': 'queued', 'total': None, 'result': None,
+                             'started_at': time.time()}, self.timeout)
+
+    def set_phase(self, phase, **fields):
+        state = cache.get(self.key) or {'total': None, 'result': None, 'started_at': time.time()}
+        if state.get('user_id') is None:
+            state['user_id'] = self.user_id
+        state.update(fields, phase=phase, updated_at=time.time())
+        if phase == 'importing':
+            state['importing_at'] = state['updated_at']
+            cache.set(self.processed_key, 0, self.timeout)
+        cache.set(self.key, state, self.timeout)
+
+    def advance(self, count):
+        try:
+            cache.incr(self.processed_key, count)
+        except ValueError:
+            # ключ истек или фаза importing не начиналась - прогресс не критичен для импорта
+            pass
+
+    def finish(self, result):
+        """
+        Сохраняет итог задачи и возвращает его
+        """
+        self.set_phase('done' if result.get('Status') else 'failed', result=result)
+        return result
+
+    def get(self):
+        """
+        Возвращает отчет о прогрессе или None, если задача неизвестна
+        """
+        state = cache.get(self.key)
+        if state is None:
+            return None
+
+        processed = cache.get(self.processed_key) or 0
+        total = state['total']
+        rows_per_second = eta = None
+        if state.get('importing_at'):
+            end = state['updated_at'] if state['phase'] in ('done', 'failed') else time.time()
+            elapsed = end - state['importing_at']
+            if processed and elapsed > 0:
+                rows_per_second = round(processed / elapsed, 1)
+                if total is not None:
+                    eta = round(max(total - processed, 0) / rows_per_second, 1)
+
+        return {
+            'user_id': state.get('user_id'),
+            'phase': state['phase'],
+            'processed': processed,
+            'total': total,
+            'rows_per_second': rows_per_second,
+            'eta_seconds': eta,
+            'result': state['result']
+        }
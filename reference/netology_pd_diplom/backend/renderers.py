@@ -0,0 +1,23 @@
+from rest_framework.renderers import JSONRenderer
+from ujson import dumps as dump_json
+
+
+class UJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на ujson
+
+    Результат побайтно совпадает с JSONRenderer: компактный JSON без экранирования
+    юникода, типы, которых нет в JSON, передаются кодировщику DRF. Ответы
+    с отступами (Accept: application/json; indent=4) по-прежнему строит JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        content = dump_json(data, ensure_ascii=False, escape_forward_slashes=False,
+                            default=self.encoder_class().default)
+        # как и JSONRenderer, экранируем разделители строк, недопустимые в JavaScript
+        return content.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
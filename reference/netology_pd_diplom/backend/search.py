@@ -0,0 +1,155 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+
+from .models import ProductInfo
+
+# таблица поискового индекса: FTS5 в SQLite, tsvector с GIN-индексом в PostgreSQL;
+# создается миграцией backend/migrations/0003_search_index.py
+SEARCH_TABLE = 'backend_product_search'
+
+VOWELS = 'аеиоуыэюя'
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'), ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+ADJECTIVE = ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'его', 'ого',
+             'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею')
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+REFLEXIVE = ('ся', 'сь')
+VERB = (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+        ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило',
+         'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'))
+NOUN = ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям',
+        'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я')
+
+
+def _strip(word, start, endings, preceded=False):
+    """
+    Отрезает самое длинное окончание из endings, лежащее не левее start
+
+    preceded=True - окончание должно идти после "а" или "я", которые остаются в слове.
+    """
+    for ending in sorted(endings, key=len, reverse=True):
+        if word.endswith(ending) and len(word) - len(ending) >= start:
+            if not preceded:
+                return word[:-len(ending)]
+            if len(word) - len(ending) > start and word[-len(ending) - 1] in 'ая':
+                return word[:-len(ending)]
+    return None
+
+
+def _strip_group(word, start, groups):
+    return _strip(word, start, groups[0], preceded=True) or _strip(word, start, groups[1])
+
+
+def _region(word, start):
+    """
+    Начало области после первой пары гласная-согласная начиная с start
+    """
+    for position in range(start + 1, len(word)):
+        if word[position] not in VOWELS and word[position - 1] in VOWELS:
+            return position + 1
+    return len(word)
+
+
+def stem(word):
+    """
+    Основа русского слова по алгоритму Snowball (Портера)
+
+    Слова на других языках и числа возвращаются без изменений.
+    """
+    word = word.lower().replace('ё', 'е')
+    rv = next((position + 1 for position, letter in enumerate(word) if letter in VOWELS), len(word))
+    if rv == len(word):
+        return word
+    r2 = _region(word, _region(word, 0) - 1)
+
+    stripped = _strip_group(word, rv, PERFECTIVE_GERUND)
+    if stripped is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        adjective = _strip(word, rv, ADJECTIVE)
+        if adjective is not None:
+            stripped = _strip_group(adjective, rv, PARTICIPLE) or adjective
+        else:
+            stripped = _strip_group(word, rv, VERB) or _strip(word, rv, NOUN)
+    word = stripped if stripped is not None else word
+
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    word = _strip(word, max(r2, rv), ('ост', 'ость')) or word
+
+    if word.endswith('нн') and len(word) - 1 > rv:
+        return word[:-1]
+    superlative = _strip(word, rv, ('ейш', 'ейше'))
+    if superlative is not None:
+        word = superlative
+        return word[:-1] if word.endswith('нн') and len(word) - 1 > rv else word
+    return word[:-1] if word.endswith('ь') and len(word) - 1 >= rv else word
+
+
+def stems(text):
+    """
+    Основы всех слов текста в порядке следования
+    """
+    return [stem(word) for word in re.findall(r'\w+', text.lower())]
+
+
+def index_products(product_info_ids):
+    """
+    Добавляет или обновляет в индексе позиции каталога по id
+    """
+    if not product_info_ids:
+        return
+    unindex_products(product_info_ids)
+    rows = ProductInfo.objects.filter(id__in=product_info_ids, is_active=True).values_list(
+        'id', 'product__name', 'model')
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.executemany(f"INSERT INTO {SEARCH_TABLE} (product_info_id, document) "
+                               f"VALUES (%s, to_tsvector('russian', %s))",
+                               [(product_info_id, f'{name} {model}') for product_info_id, name, model in rows])
+        else:
+            cursor.executemany(f'INSERT INTO {SEARCH_TABLE} (rowid, document) VALUES (%s, %s)',
+                               [(product_info_id, ' '.join(stems(f'{name} {model}')))
+                                for product_info_id, name, model in rows])
+
+
+def unindex_products(product_info_ids):
+    """
+    Удаляет позиции каталога из индекса
+    """
+    if not product_info_ids:
+        return
+    column = 'product_info_id' if connection.vendor == 'postgresql' else 'rowid'
+    product_info_ids = list(product_info_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(product_info_ids), 500):
+            batch = product_info_ids[start:start + 500]
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE {column} IN ({", ".join(["%s"] * len(batch))})',
+                           batch)
+
+
+def search_products(query):
+    """
+    Возвращает id позиций каталога, подходящих под запрос, от более релевантных к менее
+
+    Все слова запроса должны встретиться в названии товара или модели, последнее
+    слово ищется по префиксу. Результатов не больше SEARCH_MAX_RESULTS.
+    """
+    limit = getattr(settings, 'SEARCH_MAX_RESULTS', 1000)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            words = re.findall(r'\w+', query)
+            if not words:
+                return []
+            terms = ' & '.join(f"'{word}'" for word in words) + ':*'
+            cursor.execute(f"SELECT product_info_id FROM {SEARCH_TABLE}, to_tsquery('russian', %s) query "
+                           f"WHERE document @@ query ORDER BY ts_rank(document, query) DESC, product_info_id "
+                           f"LIMIT %s", [terms, limit])
+        else:
+            words = stems(query)
+            if not words:
+                return []
+            terms = ' '.join(f'"{word}"' for word in words) + '*'
+            cursor.execute(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+                           f'ORDER BY rank, rowid LIMIT %s', [terms, limit])
+        return [row[0] for row in cursor.fetchall()]
@@ -1,7 +1,8 @@
 # Верстальщик
 from rest_framework import serializers
 
-from .models import User, Category, Shop, ProductInfo, Product, ProductParameter, OrderItem, Order, Contact
+from .models import User, Category, Shop, ProductInfo, Product, ProductParameter, OrderItem, Order, Contact, \
+    CatalogEntry, ProductPriceStats
 
 
 class ContactSerializer(serializers.ModelSerializer):
@@ -45,6 +46,20 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = ('name', 'category',)
 
 
+class OfferShopSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Shop
+        fields = ('id', 'name',)
+
+
+class BestOfferSerializer(serializers.ModelSerializer):
+    shop = OfferShopSerializer(read_only=True)
+
+    class Meta:
+        model = ProductInfo
+        fields = ('id', 'model', 'shop', 'quantity', 'price',)
+
+
 class ProductParameterSerializer(serializers.ModelSerializer):
     parameter = serializers.StringRelatedField()
 
@@ -63,6 +78,35 @@ class ProductInfoSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class ProductPriceStatsSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='product_id')
+    name = serializers.CharField(source='product.name')
+    category = serializers.CharField(source='product.category.name')
+    best_offer = BestOfferSerializer(read_only=True)
+
+    class Meta:
+        model = ProductPriceStats
+        fields = ('id', 'name', 'category', 'offers', 'min_price', 'max_price', 'median_price', 'best_offer',)
+
+
+class CatalogEntrySerializer(serializers.ModelSerializer):
+    """
+    Позиция витрины в формате ProductInfoSerializer, без обращений к связанным таблицам
+    """
+    id = serializers.IntegerField(source='product_info_id')
+    product = serializers.SerializerMethodField()
+    shop = serializers.IntegerField(source='shop_id')
+    product_parameters = serializers.JSONField(source='parameters')
+
+    class Meta:
+        model = CatalogEntry
+        fields = ('id', 'model', 'product', 'shop', 'quantity', 'price', 'price_rrc', 'product_parameters',)
+        read_only_fields = fields
+
+    def get_product(self, entry):
+        return {'name': entry.product_name, 'category': entry.category_name}
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
@@ -87,3 +131,147 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ('id', 'ordered_items', 'state', 'dt', 'total_sum', 'contact',)
         read_only_fields = ('id',)
+
+
+# Быстрый путь для списков только на чтение: словари в формате сериализаторов выше
+# строятся напрямую из строк values() и предзагруженных связей, без разбора полей DRF
+
+# поля CatalogEntry для serialize_catalog_entries: queryset.values(*CATALOG_ENTRY_VALUES)
+CATALOG_ENTRY_VALUES = ('pk', 'model', 'product_name', 'category_name', 'shop_id', 'quantity', 'price', 'price_rrc',
+                        'parameters')
+
+# поля позиции каталога для параметра fields: поле ответа -> колонки CatalogEntry, в порядке вывода
+CATALOG_FIELDS = {
+    'id': ('pk',),
+    'model': ('model',),
+    # name и category - плоская замена вложенного product
+    'name': ('product_name',),
+    'category': ('category_name',),
+    'product': ('product_name', 'category_name'),
+    'shop': ('shop_id',),
+    'quantity': ('quantity',),
+    'price': ('price',),
+    'price_rrc': ('price_rrc',),
+    'product_parameters': ('parameters',),
+}
+# поля по умолчанию - формат CatalogEntrySerializer
+DEFAULT_CATALOG_FIELDS = ('id', 'model', 'product', 'shop', 'quantity', 'price', 'price_rrc', 'product_parameters')
+# compact=true - короткий формат для списков в мобильных приложениях
+COMPACT_CATALOG_FIELDS = ('id', 'name', 'quantity', 'price')
+# связи, которые параметр expand разворачивает из id в объект
+CATALOG_EXPANDABLE = ('shop',)
+
+_datetime_field = serializers.DateTimeField()
+
+
+def catalog_fieldset(query_params):
+    """
+    Поля ответа каталога из query-параметров fields и expand
+
+    fields - поля через запятую из CATALOG_FIELDS, без него - COMPACT_CATALOG_FIELDS при
+    compact=true или DEFAULT_CATALOG_FIELDS; expand=shop - магазин объектом {id, name} вместо id.
+    Возвращает (fields, expand, колонки CatalogEntry для values()). Первичный ключ выбирается
+    всегда: по нему строится курсор. При неизвестном поле выбрасывает ValueError.
+    """
+    compact = query_params.get('compact', '').lower() in ('true', '1', 'yes')
+    fields = _field_list(query_params.get('fields', ''), CATALOG_FIELDS) or (
+        COMPACT_CATALOG_FIELDS if compact else DEFAULT_CATALOG_FIELDS)
+    # поля выводятся в порядке CATALOG_FIELDS, поэтому ответ не зависит от порядка в запросе
+    fields = tuple(field for field in CATALOG_FIELDS if field in fields)
+    expand = _field_list(query_params.get('expand', ''), CATALOG_EXPANDABLE)
+    columns = tuple(dict.fromkeys(('pk', *(column for field in fields for column in CATALOG_FIELDS[field]))))
+    return fields, expand, columns
+
+
+def _field_list(value, allowed):
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f'Неизвестные поля: {", ".join(unknown)}. Доступны: {", ".join(allowed)}')
+    return fields
+
+
+def serialize_catalog_entries(rows, fields=DEFAULT_CATALOG_FIELDS, expand=()):
+    """
+    Строки values() витрины в формате CatalogEntrySerializer, ограниченном полями fields
+
+    Колонки строк - третий элемент catalog_fieldset. Для expand=shop названия
+    магазинов выбираются одним запросом по магазинам строк.
+    """
+    if fields == DEFAULT_CATALOG_FIELDS and not expand:
+        return [{
+            'id': row['pk'],
+            'model': row['model'],
+            'product': {'name': row['product_name'], 'category': row['category_name']},
+            'shop': row['shop_id'],
+            'quantity': row['quantity'],
+            'price': row['price'],
+            'price_rrc': row['price_rrc'],
+            'product_parameters': row['parameters'],
+        } for row in rows]
+
+    rows = list(rows)
+    builders = {
+        'id': lambda row: row['pk'],
+        'model': lambda row: row['model'],
+        'name': lambda row: row['product_name'],
+        'category': lambda row: row['category_name'],
+        'product': lambda row: {'name': row['product_name'], 'category': row['category_name']},
+        'shop': lambda row: row['shop_id'],
+        'quantity': lambda row: row['quantity'],
+        'price': lambda row: row['price'],
+        'price_rrc': lambda row: row['price_rrc'],
+        'product_parameters': lambda row: row['parameters'],
+    }
+    if 'shop' in expand and 'shop' in fields:
+        shops = {shop['id']: shop for shop in Shop.objects.filter(
+            id__in={row['shop_id'] for row in rows}).values('id', 'name')}
+        builders['shop'] = lambda row: shops[row['shop_id']]
+    builders = [(field, builders[field]) for field in fields]
+    return [{field: build(row) for field, build in builders} for row in rows]
+
+
+def serialize_orders(orders):
+    """
+    Заказы в формате OrderSerializer
+
+    orders - queryset заказов с аннотацией total_sum. Позиции, товары с параметрами
+    и контакты выбираются отдельными запросами values() без создания моделей.
+    """
+    orders = list(orders.values('id', 'state', 'dt', 'total_sum', 'contact_id'))
+    items = list(OrderItem.objects.filter(order_id__in=[order['id'] for order in orders]).order_by('id').values(
+        'id', 'order_id', 'product_info_id', 'quantity'))
+
+    product_info_ids = {item['product_info_id'] for item in items}
+    parameters = {}
+    for product_info_id, name, value in ProductParameter.objects.filter(product_info_id__in=product_info_ids).order_by(
+            'id').values_list('product_info_id', 'parameter__name', 'value'):
+        parameters.setdefault(product_info_id, []).append({'parameter': name, 'value': value})
+    product_infos = {row['id']: {
+        'id': row['id'],
+        'model': row['model'],
+        'product': {'name': row['product__name'], 'category': row['product__category__name']},
+        'shop': row['shop_id'],
+        'quantity': row['quantity'],
+        'price': row['price'],
+        'price_rrc': row['price_rrc'],
+        'product_parameters': parameters.get(row['id'], []),
+    } for row in ProductInfo.objects.filter(id__in=product_info_ids).values(
+        'id', 'model', 'product__name', 'product__category__name', 'shop_id', 'quantity', 'price', 'price_rrc')}
+
+    contacts = {contact['id']: contact for contact in Contact.objects.filter(
+        id__in={order['contact_id'] for order in orders}).values(
+        'id', 'city', 'street', 'house', 'structure', 'building', 'apartment', 'phone')}
+    ordered_items = {}
+    for item in items:
+        ordered_items.setdefault(item['order_id'], []).append({
+            'id': item['id'], 'product_info': product_infos[item['product_info_id']], 'quantity': item['quantity']})
+
+    return [{
+        'id': order['id'],
+        'ordered_items': ordered_items.get(order['id'], []),
+        'state': order['state'],
+        'dt': _datetime_field.to_representation(order['dt']),
+        'total_sum': None if order['total_sum'] is None else int(order['total_sum']),
+        'contact': contacts.get(order['contact_id']),
+    } for order in orders]
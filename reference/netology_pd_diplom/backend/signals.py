@@ -2,11 +2,17 @@ from typing import Type
 
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
-from django.db.models.signals import post_save
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver, Signal
 from django_rest_passwordreset.signals import reset_password_token_created
 
-from .models import ConfirmEmailToken, User
+from .autocomplete import bump_autocomplete_version
+from .catalog import bump_catalog_version, product_info_changed
+from .dictionaries import category_ids, parameter_ids
+from .models import CatalogEntry, Category, ConfirmEmailToken, Parameter, Product, ProductInfo, ProductParameter, \
+    Shop, User
+from .prices import refresh_price_stats, shop_product_ids
 
 new_user_registered = Signal()
 
@@ -80,3 +86,74 @@ def new_order_signal(user_id, **kwargs):
         [user.email]
     )
     msg.send()
+
+
+@receiver(post_save, sender=Parameter)
+@receiver(post_delete, sender=Parameter)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def reference_changed_signal(sender, created=False, **kwargs):
+    """
+    сбрасываем словари импорта при переименовании или удалении записей
+    """
+    if not created:
+        (parameter_ids if sender is Parameter else category_ids).clear()
+
+
+@receiver(post_delete, sender=Shop)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Shop)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Product)
+def catalog_entry_source_changed_signal(sender, instance, created=False, **kwargs):
+    """
+    обновляем витрину каталога при правке магазина, категории или товара
+    """
+    if created or kwargs['signal'] is post_delete:
+        # в витрине этих записей еще (или уже) нет, но меняются списки магазинов и категорий
+        bump_catalog_version()
+        if sender is Shop and not created:
+            bump_autocomplete_version()
+        return
+    if sender is Shop:
+        CatalogEntry.objects.filter(shop_id=instance.id).update(shop_state=instance.state)
+        refresh_price_stats(shop_product_ids([instance.id]))
+        bump_catalog_version(instance.id)
+        # подсказки строятся по позициям активных магазинов
+        bump_autocomplete_version()
+        return
+
+    if sender is Category:
+        entries = CatalogEntry.objects.filter(category_id=instance.id)
+        shop_ids = list(entries.values_list('shop_id', flat=True).distinct().order_by())
+        entries.update(category_name=instance.name)
+    else:
+        entries = CatalogEntry.objects.filter(product_id=instance.id)
+        shop_ids = list(entries.values_list('shop_id', flat=True).distinct().order_by())
+        entries.update(product_name=instance.name, category_id=instance.category_id,
+                       category_name=instance.category.name)
+    bump_catalog_version(*shop_ids)
+
+
+@receiver(post_save, sender=ProductInfo)
+@receiver(post_delete, sender=ProductInfo)
+@receiver(post_save, sender=ProductParameter)
+@receiver(post_delete, sender=ProductParameter)
+def product_info_changed_signal(sender, instance, **kwargs):
+    """
+    обновляем витрину, поиск, счетчики и сравнение цен при правке позиции или ее параметров вне импорта
+    """
+    if sender is ProductParameter:
+        product_info_changed(instance.product_info_id, parameters=True)
+    else:
+        product_info_changed(instance.id, instance.product_id, instance.shop_id)
+
+
+@receiver(connection_created)
+def sqlite_wal_signal(sender, connection, **kwargs):
+    """
+    включаем WAL для SQLite, чтобы применение импорта не блокировало чтение каталога
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
@@ -0,0 +1,115 @@
+import re
+import zlib
+from itertools import islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .renderers import UJSONRenderer
+
+try:
+    import brotli
+except ImportError:
+    # brotli - необязательная зависимость, без нее ответы сжимаются только gzip
+    brotli = None
+
+ACCEPT_ENCODING = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def stream_batch_size():
+    return getattr(settings, 'STREAM_BATCH_SIZE', 500)
+
+
+def stream_requested(request):
+    return request.query_params.get('stream', '').lower() in ('true', '1', 'yes')
+
+
+def iterate_batches(iterable, size):
+    """
+    Разбивает поток на списки длиной size, не читая его целиком
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def queryset_batches(queryset, serialize, size):
+    """
+    Сериализует queryset пачками по size объектов в порядке queryset
+
+    id читаются курсором (в PostgreSQL - серверным), serialize получает
+    queryset одной пачки и возвращает список словарей с ключом 'id'.
+    """
+    for ids in iterate_batches(queryset.values_list('pk', flat=True).iterator(chunk_size=size), size):
+        position = {pk: number for number, pk in enumerate(ids)}
+        yield sorted(serialize(queryset.filter(pk__in=ids)), key=lambda row: position[row['id']])
+
+
+def json_array_chunks(batches, prefix=b'', suffix=b''):
+    """
+    Кодирует поток пачек словарей в JSON-массив, по пачке за раз
+
+    prefix и suffix оборачивают массив, например b'{"Orders":' и b'}'.
+    """
+    renderer = UJSONRenderer()
+    yield prefix + b'['
+    separator = b''
+    for batch in batches:
+        if batch:
+            # пачка кодируется массивом, от которого отрезаются скобки
+            yield separator + renderer.render(batch)[1:-1]
+            separator = b','
+    yield b']' + suffix
+
+
+def accepted_encoding(request):
+    """
+    Лучшее сжатие, которое принимает клиент по Accept-Encoding: 'br', 'gzip' или None
+    """
+    weights = {}
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        match = ACCEPT_ENCODING.match(part)
+        if match:
+            try:
+                weights[match.group(1).lower()] = float(match.group(2) or 1)
+            except ValueError:
+                continue
+
+    available = ('br', 'gzip') if brotli is not None else ('gzip',)
+    candidates = [(weights.get(encoding, weights.get('*', 0)), encoding) for encoding in available]
+    weight, encoding = max(candidates, key=lambda candidate: candidate[0])
+    return encoding if weight > 0 else None
+
+
+def compress(chunks, encoding):
+    """
+    Сжимает поток по мере чтения; каждая часть сбрасывается сразу, чтобы клиент получал данные без задержки
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor()
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+def streaming_json_response(request, batches, prefix=b'', suffix=b''):
+    """
+    Потоковый JSON-ответ из пачек словарей со сжатием по Accept-Encoding
+
+    Ответ строится по мере отправки, поэтому в памяти процесса одновременно
+    находится только одна пачка.
+    """
+    chunks = json_array_chunks(batches, prefix, suffix)
+    encoding = accepted_encoding(request)
+    response = StreamingHttpResponse(compress(chunks, encoding) if encoding else chunks,
+                                     content_type='application/json')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
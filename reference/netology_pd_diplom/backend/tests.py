@@ -1,14 +1,109 @@
+import gzip
 import json
-from django.test import TestCase
+import os
+from statistics import median
+from io import StringIO
+import tempfile
+import threading
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import yaml
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.db.migrations.loader import MigrationLoader
+from django.db.models import F, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
-from unittest.mock import patch
+from unittest.mock import call, patch
 from rest_framework.authtoken.models import Token
 import time
+from decimal import Decimal
 
 from .models import User, Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, OrderItem, \
-    Contact
+    Contact, StagedExternalId, StagedProductInfo, CatalogEntry, ProductFacet, ProductPriceStats
+from .autocomplete import INDEX_KEY, Autocomplete, autocomplete, bump_autocomplete_version, publish_index
+from .catalog import bump_catalog_version, refresh_catalog_entries, refresh_parameter_documents
+from .dictionaries import NameDictionary, category_ids, parameter_ids
+from .celery_tasks import async_partner_update, finish_partner_import
+from .importer import CatalogImporter, import_data, import_file, import_from_url
+from .price_list import fetch_price_list, load_price_list, price_list_storage
+from .progress import ImportProgress
+from .parameters import parse_number
+from .renderers import UJSONRenderer
+from .search import SEARCH_TABLE, search_products
+from .serializers import OrderSerializer, ProductInfoSerializer, serialize_orders
+
+SHOP1_YAML = os.path.join(settings.BASE_DIR, '..', '..', 'data', 'shop1.yaml')
+
+
+def shop1_data():
+    """Прайс-лист data/shop1.yaml в виде словаря"""
+    with open(SHOP1_YAML, encoding='utf-8') as file:
+        return yaml.safe_load(file)
+
+
+class PriceListServer:
+    """Локальный HTTP-сервер, отдающий прайс-лист с ETag"""
+
+    def __init__(self, body, etag='"v1"'):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(dict(self.headers))
+                if self.headers.get('If-None-Match') == server.etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', server.etag)
+                self.send_header('Content-Length', str(len(server.body)))
+                self.end_headers()
+                self.wfile.write(server.body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}/price.yaml'
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class AppQueries(CaptureQueriesContext):
+    """
+    Запросы приложения без служебных запросов профилировщика silk
+
+    SilkyMiddleware перехватывает часть запросов (SILKY_INTERCEPT_PERCENT) и добавляет к ним
+    свои INSERT, точки сохранения и EXPLAIN, поэтому тесты считают только запросы приложения.
+    """
+
+    def __init__(self):
+        super().__init__(connection)
+
+    @property
+    def captured_queries(self):
+        return [query for query in super().captured_queries
+                if not query['sql'].startswith(('EXPLAIN', 'SAVEPOINT', 'RELEASE SAVEPOINT'))
+                and '"silk_' not in query['sql']]
 
 
 class ThrottlingTests(TestCase):
@@ -556,11 +651,9 @@ class BackendAPITestCase(TestCase):
         """
 
         # Тестируем импорт
-        with patch('backend.views.get') as mock_get:
-            mock_get.return_value.content = yaml_data.encode('utf-8')
-
+        with PriceListServer(yaml_data.encode('utf-8')) as server:
             data = {
-                'url': 'http://example.com/price.yaml'
+                'url': server.url
             }
 
             response = self.client.post(url, data, format='json')
@@ -745,6 +838,66 @@ class BackendAPITestCase(TestCase):
                 self.assertEqual(basket.state, 'new',
                                  f"Order state should be 'new' but is '{basket.state}'")
 
+    def test_15_order_listings(self):
+        """Корзина и заказы отдаются быстрым путем в формате OrderSerializer"""
+        self.test_09_order_creation()
+        self.client.post(reverse('backend:basket'), {'items': [{'product_info': self.product_info2.id, 'quantity': 3}]},
+                         format='json')
+
+        response = self.client.get(reverse('backend:basket'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        item = response.json()['ordered_items'][0]
+        self.assertEqual(item['product_info']['product']['name'], 'Футболка')
+        self.assertEqual((item['available_quantity'], item['is_available']), (20, True))
+
+        response = self.client.get(reverse('backend:order'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        order = response.json()['Orders'][0]
+        self.assertEqual(order['contact_details']['city'], 'Москва')
+        self.assertEqual((order['ordered_items'][0]['product_name'], order['ordered_items'][0]['shop_name'],
+                          order['ordered_items'][0]['total_price']), ('Смартфон', 'Test Shop', 10000))
+
+        orders = Order.objects.filter(user=self.user).annotate(
+            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).order_by('id')
+        self.assertEqual(UJSONRenderer().render(serialize_orders(orders)), JSONRenderer().render(OrderSerializer(
+            orders.prefetch_related('ordered_items__product_info__product__category',
+                                    'ordered_items__product_info__product_parameters__parameter').select_related(
+                'contact'), many=True).data))
+
+    def test_16_ujson_renderer(self):
+        """UJSONRenderer выдает те же байты, что и JSONRenderer"""
+        data = {'text': 'Смартфон "X" / 5\u2028\u2029', 'dt': timezone.now(), 'price': Decimal('1.50'),
+                'items': [1, None, True, {'nested': []}]}
+        self.assertEqual(UJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(UJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+    @override_settings(STREAM_BATCH_SIZE=1)
+    def test_17_streamed_orders(self):
+        """Заказы в потоковом ответе совпадают с обычным ответом"""
+        self.test_09_order_creation()
+        self.client.post(reverse('backend:basket'), {'items': [{'product_info': self.product_info2.id, 'quantity': 3}]},
+                         format='json')
+        basket = Order.objects.get(user=self.user, state='basket')
+        with patch('backend.views.new_order.send'), \
+                patch('backend.celery_tasks.send_order_confirmation_email.delay'):
+            response = self.client.post(reverse('backend:order'), {
+                'id': basket.id, 'contact': Contact.objects.filter(user=self.user).first().id}, format='json')
+        self.assertTrue(response.json()['Status'])
+
+        response = self.client.get(reverse('backend:order'), {'stream': 'true'})
+        self.assertTrue(response.streaming)
+        self.assertNotIn('Content-Encoding', response)
+        content = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(content['Orders']), 2)
+        self.assertEqual(content, self.client.get(reverse('backend:order')).json())
+
+        self.client.credentials()
+        self.client.force_authenticate(self.product_info1.shop.user)
+        response = self.client.get(reverse('backend:partner-orders'), {'stream': 'true'})
+        self.assertEqual(json.loads(b''.join(response.streaming_content)),
+                         self.client.get(reverse('backend:partner-orders')).json())
+
 
 class ModelTests(TestCase):
     """Тесты моделей"""
@@ -781,6 +934,19 @@ class ModelTests(TestCase):
         self.assertEqual(order.user, self.user)
         self.assertEqual(order.state, 'basket')
 
+    def test_migrations(self):
+        """Миграции совпадают с моделями, а 0001_initial - схема исходной версии без таблиц каталога"""
+        call_command('makemigrations', 'backend', check=True, dry_run=True, stdout=StringIO())
+
+        graph = MigrationLoader(None, ignore_no_migrations=True).graph
+        initial = graph.nodes[('backend', '0001_initial')]
+        created = {operation.name for operation in initial.operations if hasattr(operation, 'fields')}
+        self.assertFalse(created & {'CatalogEntry', 'StagedProductInfo', 'StagedExternalId', 'ProductFacet',
+                                    'ProductPriceStats'})
+        self.assertEqual(graph.forwards_plan(('backend', '0003_search_index'))[-3:],
+                         [('backend', '0001_initial'), ('backend', '0002_catalog_read_model'),
+                          ('backend', '0003_search_index')])
+
 
 class ErrorHandlingTests(TestCase):
     """Тесты обработки ошибок"""
@@ -829,4 +995,1091 @@ class ErrorHandlingTests(TestCase):
 
         # Проверяем что статус False
         self.assertFalse(response_data.get('Status', True))
-        self.assertIn('Errors', response_data)
\ No newline at end of file
+        self.assertIn('Errors', response_data)
+
+class ImportDataTests(TestCase):
+    """Тесты импорта прайс-листов"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            first_name='Import',
+            last_name='Shop',
+            email='import@example.com',
+            password='testpass123',
+            type='shop',
+            is_active=True
+        )
+
+    def make_data(self, goods_count):
+        """Формирует прайс-лист в формате data/shop1.yaml"""
+        return {
+            'shop': 'Import Shop',
+            'categories': [{'id': 224, 'name': 'Смартфоны'}, {'id': 15, 'name': 'Аксессуары'}],
+            'goods': [{
+                'id': 1000 + i,
+                'category': 224 if i % 2 else 15,
+                'model': f'model/{i}',
+                'name': f'Товар {i}',
+                'price': 100 + i,
+                'price_rrc': 120 + i,
+                'quantity': i % 7,
+                'parameters': {'Цвет': 'черный', 'Диагональ (дюйм)': 6.5, f'Параметр {i % 3}': i},
+            } for i in range(goods_count)]
+        }
+
+    def test_reference_dictionaries_are_shared(self):
+        """Повторный импорт не обращается к таблицам параметров и категорий"""
+        self.addCleanup(parameter_ids.clear)
+        self.addCleanup(category_ids.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            import_data(self.user, self.make_data(10))
+
+        data = self.make_data(10)
+        data['goods'][0]['parameters']['Новый параметр'] = 'да'
+        with self.captureOnCommitCallbacks(execute=True), AppQueries() as queries:
+            import_data(self.user, data)
+
+        # join с этими таблицами при сборке витрины не в счет, считаются только обращения к самим справочникам
+        reference_queries = [query['sql'] for query in queries.captured_queries
+                             if any(f'{clause} "backend_{table}"' in query['sql']
+                                    for clause in ('FROM', 'INTO') for table in ('parameter', 'category'))]
+        # только создание нового параметра и чтение его id
+        self.assertEqual(len(reference_queries), 2)
+        self.assertEqual(Parameter.objects.filter(name='Новый параметр').count(), 1)
+        self.assertIn('Новый параметр', parameter_ids.get_ids(['Новый параметр']))
+
+    def test_reference_dictionaries_follow_other_processes(self):
+        """Переименование параметра сбрасывает словари всех процессов, а не только изменившего"""
+        # словарь другого процесса, сигнал его не видит
+        other_process = NameDictionary(Parameter)
+        with self.captureOnCommitCallbacks(execute=True):
+            parameter_id = other_process.get_ids(['Цвет'])['Цвет']
+
+        parameter = Parameter.objects.get(id=parameter_id)
+        parameter.name = 'Цвет корпуса'
+        with self.captureOnCommitCallbacks(execute=True):
+            parameter.save()
+
+        # старое название больше не указывает на переименованный параметр
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertNotEqual(other_process.get_ids(['Цвет'])['Цвет'], parameter_id)
+        self.assertEqual(Parameter.objects.count(), 2)
+
+    def test_import_creates_catalog(self):
+        """Импорт создает товары, параметры и привязывает категории"""
+        result = import_data(self.user, self.make_data(10))
+
+        self.assertEqual(result['categories_processed'], 2)
+        self.assertEqual(result['products_imported'], 10)
+        self.assertEqual(result['inserted'], 10)
+        shop = Shop.objects.get(user=self.user)
+        self.assertEqual(ProductInfo.objects.filter(shop=shop).count(), 10)
+        self.assertEqual(ProductParameter.objects.filter(product_info__shop=shop).count(), 30)
+        self.assertEqual(set(shop.categories.values_list('id', flat=True)), {224, 15})
+        self.assertEqual(ProductParameter.objects.get(product_info__external_id=1000,
+                                                      parameter__name='Диагональ (дюйм)').value, '6.5')
+
+    def test_import_query_count_does_not_grow_with_rows(self):
+        """Число запросов зависит от числа пачек, а не от числа товаров"""
+        other_user = User.objects.create_user(email='import2@example.com', password='testpass123', type='shop')
+
+        with CaptureQueriesContext(connection) as small:
+            import_data(self.user, self.make_data(5))
+        with CaptureQueriesContext(connection) as large:
+            import_data(other_user, self.make_data(500))
+
+        # в 100 раз больше товаров, но запросов меньше чем вдвое больше (вставки делятся только по лимиту БД)
+        self.assertLess(len(large.captured_queries), len(small.captured_queries) * 2)
+
+    def test_reimport_applies_only_changes(self):
+        """Повторный импорт обновляет только изменившиеся строки и снимает пропавшие"""
+        data = self.make_data(10)
+        import_data(self.user, data)
+        shop = Shop.objects.get(user=self.user)
+        retired = ProductInfo.objects.get(shop=shop, external_id=1009)
+        order = Order.objects.create(user=self.user, state='new')
+        OrderItem.objects.create(order=order, product_info=retired, quantity=1)
+        unchanged_parameter_ids = set(ProductParameter.objects.filter(
+            product_info__external_id=1005).values_list('id', flat=True))
+
+        data['goods'][0]['price'] = 999
+        data['goods'][1]['parameters']['Цвет'] = 'белый'
+        data['goods'].pop()
+        data['goods'].append(dict(data['goods'][2], id=2000, name='Новый товар'))
+        result = import_data(self.user, data)
+
+        self.assertEqual((result['inserted'], result['updated'], result['unchanged'], result['removed']),
+                         (1, 2, 7, 1))
+        self.assertEqual(ProductInfo.objects.get(shop=shop, external_id=1000).price, 999)
+        self.assertEqual(ProductParameter.objects.get(product_info__external_id=1001, parameter__name='Цвет').value,
+                         'белый')
+        # строки без изменений не пересоздаются
+        self.assertEqual(set(ProductParameter.objects.filter(
+            product_info__external_id=1005).values_list('id', flat=True)), unchanged_parameter_ids)
+        # пропавшая позиция снята с продажи, а заказ на нее сохранился
+        retired.refresh_from_db()
+        self.assertFalse(retired.is_active)
+        self.assertTrue(OrderItem.objects.filter(product_info=retired).exists())
+
+        result = import_data(self.user, data)
+        self.assertEqual((result['inserted'], result['updated'], result['unchanged'], result['removed']),
+                         (0, 0, 10, 0))
+
+
+class PriceListParserTests(TestCase):
+    """Тесты потокового разбора прайс-листа"""
+
+    def test_matches_full_load(self):
+        """Потоковый разбор дает то же, что и полная загрузка документа"""
+        with open(SHOP1_YAML, 'rb') as file:
+            expected = yaml.safe_load(file)
+        with open(SHOP1_YAML, 'rb') as file:
+            data = load_price_list(file)
+            self.assertIsInstance(data['goods'], types.GeneratorType)
+            self.assertEqual(data['shop'], expected['shop'])
+            self.assertEqual(data['categories'], expected['categories'])
+            self.assertEqual(list(data['goods']), expected['goods'])
+
+    def test_goods_are_parsed_lazily(self):
+        """Позиции разбираются по одной: ошибка во второй не мешает получить первую"""
+        data = load_price_list('shop: s\ncategories: []\ngoods:\n  - {id: 1, name: a}\n  - {id: 2, name: [}\n')
+        self.assertEqual(next(data['goods']), {'id': 1, 'name': 'a'})
+        with self.assertRaises(yaml.YAMLError):
+            next(data['goods'])
+
+    def test_goods_before_shop_rejected(self):
+        """Раздел goods должен идти после shop и categories"""
+        with self.assertRaises(ValueError):
+            load_price_list('goods: []\nshop: s\ncategories: []\n')
+
+    def test_sync_file_upload(self):
+        """Синхронная загрузка файла партнером"""
+        user = User.objects.create_user(email='upload@example.com', password='testpass123', type='shop',
+                                        is_active=True)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        with open(SHOP1_YAML, 'rb') as file:
+            upload = SimpleUploadedFile('shop1.yaml', file.read())
+
+        response = client.post(reverse('backend:partner-update'), {'file': upload}, format='multipart')
+        response_data = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_data['Details']['products_imported'], 14)
+        self.assertEqual(ProductInfo.objects.filter(shop__user=user).count(), 14)
+
+
+@override_settings(PRICE_LIST_ROOT=tempfile.mkdtemp())
+class AsyncPartnerUpdateTests(TestCase):
+    """Тесты асинхронного импорта"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='async@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+    def test_upload_is_passed_by_reference(self):
+        """В задачу уходит имя сохраненного файла, а воркер читает его с диска и удаляет"""
+        with open(SHOP1_YAML, 'rb') as file:
+            upload = SimpleUploadedFile('shop1.yaml', file.read())
+
+        with patch('backend.celery_tasks.async_partner_update.delay') as mock_delay:
+            mock_delay.return_value.id = 'task-1'
+            response = self.client.post(reverse('backend:partner-update'), {'file': upload, 'async': 'true'},
+                                        format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        user_id, file_name, url = mock_delay.call_args.args
+        self.assertEqual((user_id, url), (self.user.id, None))
+        self.assertTrue(price_list_storage().exists(file_name))
+
+        with self.settings(IMPORT_CHUNK_SIZE=5), patch('backend.celery_tasks.send_import_report.delay'), \
+                patch('backend.celery_tasks.chord') as mock_chord:
+            result = async_partner_update(user_id, file_name, url)
+
+        self.assertTrue(result['Status'])
+        self.assertFalse(price_list_storage().exists(file_name))
+
+        # 14 позиций по 5 в части - три параллельные задачи и завершающая
+        header, = mock_chord.call_args.args
+        header = list(header)
+        body, = mock_chord.return_value.call_args.args
+        self.assertEqual(len(header), 3)
+        with patch('backend.celery_tasks.send_import_report.delay') as mock_report:
+            result = body([chunk() for chunk in header])
+
+        self.assertTrue(result['Status'])
+        self.assertEqual(result['Details']['products_imported'], 14)
+        self.assertEqual(result['Details']['inserted'], 14)
+        mock_report.assert_called_once_with(self.user.email, 4, 14)
+        self.assertEqual(ProductInfo.objects.filter(shop__user=self.user, is_active=True).count(), 14)
+        self.assertEqual(os.listdir(price_list_storage().location), [])
+
+    def test_import_status(self):
+        """Ход фонового импорта доступен владельцу по task_id"""
+        with open(SHOP1_YAML, 'rb') as file:
+            upload = SimpleUploadedFile('shop1.yaml', file.read())
+
+        with patch('backend.celery_tasks.async_partner_update.delay') as mock_delay:
+            mock_delay.return_value.id = 'task-1'
+            self.client.post(reverse('backend:partner-update'), {'file': upload, 'async': 'true'},
+                             format='multipart')
+        status_url = reverse('backend:partner-import-status', args=['task-1'])
+
+        response = self.client.get(status_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['phase'], 'queued')
+
+        other = User.objects.create_user(email='other@example.com', password='testpass123', type='shop',
+                                         is_active=True)
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(status_url).status_code, status.HTTP_404_NOT_FOUND)
+        self.client.force_authenticate(self.user)
+
+        with self.settings(IMPORT_CHUNK_SIZE=5), patch('backend.celery_tasks.chord') as mock_chord:
+            async_partner_update.apply(args=mock_delay.call_args.args, task_id='task-1')
+        header, = mock_chord.call_args.args
+        body, = mock_chord.return_value.call_args.args
+
+        results = [header[0]()]
+        progress = self.client.get(status_url).json()
+        self.assertEqual((progress['phase'], progress['processed'], progress['total']), ('importing', 5, 14))
+
+        with patch('backend.celery_tasks.send_import_report.delay'):
+            body(results + [chunk() for chunk in header[1:]])
+        progress = self.client.get(status_url).json()
+        self.assertEqual((progress['phase'], progress['processed'], progress['total']), ('done', 14, 14))
+        self.assertEqual(progress['result']['Details']['inserted'], 14)
+
+    def test_status_of_skipped_import(self):
+        """Отчет доступен владельцу и для импорта, который закончился, не начавшись"""
+        with open(SHOP1_YAML, 'rb') as file:
+            import_file(self.user, file)
+            file.seek(0)
+            file_name = price_list_storage().save('shop1.yaml', SimpleUploadedFile('shop1.yaml', file.read()))
+
+        async_partner_update.apply(args=(self.user.id, file_name, None), task_id='task-2')
+
+        response = self.client.get(reverse('backend:partner-import-status', args=['task-2']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['phase'], 'done')
+        self.assertEqual(response.json()['result']['Details'], {'feed_unchanged': True})
+
+    def test_catalog_switches_at_finish(self):
+        """Части только готовят изменения, покупатели видят новую версию целиком после завершения"""
+        with open(SHOP1_YAML, 'rb') as file:
+            import_file(self.user, file)
+        shop = Shop.objects.get(user=self.user)
+        old_prices = dict(ProductInfo.objects.filter(shop=shop).values_list('external_id', 'price'))
+
+        data = shop1_data()
+        retired = data['goods'].pop()['id']
+        for item in data['goods']:
+            item['price'] += 1
+        feed = yaml.dump(data, sort_keys=False, allow_unicode=True).encode()
+        file_name = price_list_storage().save('changed.yaml', SimpleUploadedFile('changed.yaml', feed))
+        with self.settings(IMPORT_CHUNK_SIZE=5), patch('backend.celery_tasks.chord') as mock_chord:
+            async_partner_update(self.user.id, file_name, None)
+        header, = mock_chord.call_args.args
+        body, = mock_chord.return_value.call_args.args
+        results = [chunk() for chunk in header]
+
+        # после всех частей каталог еще прежний
+        self.assertEqual(dict(ProductInfo.objects.filter(shop=shop, is_active=True).values_list(
+            'external_id', 'price')), old_prices)
+        self.assertEqual(dict(CatalogEntry.objects.filter(shop_id=shop.id).values_list(
+            'product_info__external_id', 'price')), old_prices)
+        self.assertEqual(StagedProductInfo.objects.count(), 13)
+        self.assertEqual(Shop.objects.get(id=shop.id).catalog_version, shop.catalog_version)
+
+        with patch('backend.celery_tasks.send_import_report.delay'):
+            body(results)
+        new_prices = {external_id: price + 1 for external_id, price in old_prices.items() if external_id != retired}
+        self.assertEqual(dict(ProductInfo.objects.filter(shop=shop, is_active=True).values_list(
+            'external_id', 'price')), new_prices)
+        self.assertEqual(Shop.objects.get(id=shop.id).catalog_version, shop.catalog_version + 1)
+        self.assertFalse(StagedProductInfo.objects.exists())
+        self.assertFalse(StagedExternalId.objects.exists())
+
+    def test_failed_chunk_keeps_catalog(self):
+        """Если часть не загрузилась, пропавшие позиции не снимаются с продажи"""
+        with open(SHOP1_YAML, 'rb') as file:
+            import_file(self.user, file)
+
+        with patch('backend.celery_tasks.send_import_error.delay') as mock_error:
+            result = finish_partner_import([{'Error': 'boom'}], self.user.id, Shop.objects.get(user=self.user).id,
+                                           4, {'feed_digest': 'x'})
+
+        self.assertFalse(result['Status'])
+        mock_error.assert_called_once()
+        self.assertEqual(ProductInfo.objects.filter(shop__user=self.user, is_active=True).count(), 14)
+        self.assertNotEqual(Shop.objects.get(user=self.user).feed_digest, 'x')
+
+    def test_lost_chunk_is_cleaned_up(self):
+        """Если задача-часть упала целиком, подготовленные строки удаляются, а импорт помечается неудавшимся"""
+        with open(SHOP1_YAML, 'rb') as file:
+            file_name = price_list_storage().save('shop1.yaml', SimpleUploadedFile('shop1.yaml', file.read()))
+        with self.settings(IMPORT_CHUNK_SIZE=5), patch('backend.celery_tasks.chord') as mock_chord:
+            async_partner_update.apply(args=(self.user.id, file_name, None), task_id='task-1')
+        header, = mock_chord.call_args.args
+        body, = mock_chord.return_value.call_args.args
+        results = [chunk() for chunk in list(header)[:2]]
+
+        # список позиций прайс-листа не передается через результаты задач
+        self.assertEqual(set(results[0]), {'inserted', 'updated', 'unchanged'})
+        self.assertEqual(StagedExternalId.objects.count(), 10)
+
+        errback, = body.options['link_error']
+        with patch('backend.celery_tasks.send_import_error.delay') as mock_error:
+            errback(None, RuntimeError('worker lost'), None)
+
+        mock_error.assert_called_once_with(self.user.email, 'worker lost')
+        self.assertFalse(StagedProductInfo.objects.exists())
+        self.assertFalse(StagedExternalId.objects.exists())
+        self.assertEqual(ImportProgress('task-1').get()['phase'], 'failed')
+        self.assertEqual(os.listdir(price_list_storage().location), [])
+
+    def test_failed_dispatch_is_cleaned_up(self):
+        """Если chord не удалось запустить, файлы частей и подготовленные строки удаляются"""
+        with open(SHOP1_YAML, 'rb') as file:
+            file_name = price_list_storage().save('shop1.yaml', SimpleUploadedFile('shop1.yaml', file.read()))
+        with self.settings(IMPORT_CHUNK_SIZE=5), patch('backend.celery_tasks.chord') as mock_chord, \
+                patch('backend.celery_tasks.send_import_error.delay') as mock_error, \
+                patch('backend.importer.CatalogImporter.discard') as mock_discard:
+            mock_chord.return_value.side_effect = ConnectionRefusedError('broker is down')
+            result = async_partner_update.apply(args=(self.user.id, file_name, None), task_id='task-3').get()
+
+        self.assertFalse(result['Status'])
+        mock_error.assert_called_once_with(self.user.email, 'broker is down')
+        mock_discard.assert_called_once_with()
+        self.assertEqual(ImportProgress('task-3').get()['phase'], 'failed')
+        self.assertEqual(os.listdir(price_list_storage().location), [])
+
+    def test_failed_sync_import_keeps_catalog(self):
+        """Ошибка посреди прайс-листа не оставляет частично примененный каталог"""
+        with open(SHOP1_YAML, 'rb') as file:
+            import_file(self.user, file)
+        shop = Shop.objects.get(user=self.user)
+        before = list(ProductInfo.objects.filter(shop=shop).order_by('id').values_list('id', 'price', 'is_active'))
+
+        data = shop1_data()
+
+        def goods():
+            for item in data['goods'][:5]:
+                yield dict(item, price=item['price'] + 1)
+            raise ValueError('broken feed')
+
+        with self.settings(IMPORT_BATCH_SIZE=2), self.assertRaises(ValueError):
+            import_data(self.user, dict(data, goods=goods()))
+
+        self.assertEqual(list(ProductInfo.objects.filter(shop=shop).order_by('id').values_list(
+            'id', 'price', 'is_active')), before)
+        self.assertFalse(StagedProductInfo.objects.exists())
+        self.assertEqual(Shop.objects.get(id=shop.id).catalog_version, shop.catalog_version)
+
+    def test_failed_apply_keeps_catalog(self):
+        """Ошибка при переносе второй пачки откатывает и первую"""
+        with open(SHOP1_YAML, 'rb') as file:
+            import_file(self.user, file)
+        shop = Shop.objects.get(user=self.user)
+        before = list(ProductInfo.objects.filter(shop=shop).order_by('id').values_list('id', 'price', 'is_active'))
+        entries = list(CatalogEntry.objects.filter(shop_id=shop.id).order_by('product_info_id').values_list(
+            'product_info_id', 'price'))
+
+        data = shop1_data()
+        data['goods'].pop()
+        for item in data['goods']:
+            item['price'] += 1
+
+        apply_rows = CatalogImporter._apply_rows
+        applied = []
+
+        def apply_once(importer, rows):
+            if applied:
+                raise DatabaseError('disk full')
+            applied.append(len(rows))
+            return apply_rows(importer, rows)
+
+        with self.settings(IMPORT_BATCH_SIZE=2), self.assertRaises(DatabaseError), \
+                patch.object(CatalogImporter, '_apply_rows', autospec=True, side_effect=apply_once):
+            import_data(self.user, data, feed_digest='x')
+
+        self.assertEqual(applied, [2])
+        self.assertEqual(list(ProductInfo.objects.filter(shop=shop).order_by('id').values_list(
+            'id', 'price', 'is_active')), before)
+        self.assertEqual(list(CatalogEntry.objects.filter(shop_id=shop.id).order_by('product_info_id').values_list(
+            'product_info_id', 'price')), entries)
+        self.assertFalse(StagedProductInfo.objects.exists())
+        self.assertFalse(StagedExternalId.objects.exists())
+        self.assertNotEqual(Shop.objects.get(id=shop.id).feed_digest, 'x')
+        self.assertEqual(Shop.objects.get(id=shop.id).catalog_version, shop.catalog_version)
+
+
+@override_settings(PRICE_LIST_ROOT=tempfile.mkdtemp())
+class FetchPriceListTests(TestCase):
+    """Тесты скачивания прайс-листа по URL"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='fetch@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        with open(SHOP1_YAML, 'rb') as file:
+            self.body = file.read()
+
+    def test_unchanged_feed_is_skipped(self):
+        """Повторная загрузка отправляет If-None-Match и пропускает импорт на ответ 304"""
+        with PriceListServer(self.body) as server:
+            result = import_from_url(self.user, server.url)
+            self.assertEqual(result['products_imported'], 14)
+            shop = Shop.objects.get(user=self.user)
+            self.assertEqual((shop.url, shop.url_etag), (server.url, '"v1"'))
+
+            with AppQueries() as queries:
+                result = import_from_url(self.user, server.url)
+
+        self.assertEqual(result, {'feed_unchanged': True})
+        self.assertEqual(server.requests[-1].get('If-None-Match'), '"v1"')
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(os.listdir(price_list_storage().location), [])
+
+    def test_size_limit(self):
+        """Прайс-лист больше PRICE_LIST_MAX_SIZE не скачивается"""
+        with PriceListServer(self.body) as server, self.settings(PRICE_LIST_MAX_SIZE=100):
+            with self.assertRaises(ValueError):
+                fetch_price_list(server.url)
+        self.assertEqual(os.listdir(price_list_storage().location), [])
+
+
+class FeedDigestTests(TestCase):
+    """Тесты пропуска повторной загрузки того же прайс-листа"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='digest@example.com', password='testpass123', type='shop',
+                                             is_active=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        with open(SHOP1_YAML, 'rb') as file:
+            self.body = file.read()
+
+    def upload(self, body):
+        response = self.client.post(reverse('backend:partner-update'),
+                                    {'file': SimpleUploadedFile('shop1.yaml', body)}, format='multipart')
+        return json.loads(response.content)
+
+    def test_same_file_is_not_imported_twice(self):
+        """Тот же файл не трогает таблицы каталога, измененный импортируется"""
+        self.assertEqual(self.upload(self.body)['Details']['products_imported'], 14)
+
+        with AppQueries() as queries:
+            response_data = self.upload(self.body)
+        self.assertEqual(response_data['Details'], {'feed_unchanged': True})
+        self.assertFalse([query for query in queries.captured_queries
+                          if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))])
+
+        response_data = self.upload(self.body.replace(b'price: 110000', b'price: 100000'))
+        self.assertEqual(response_data['Details']['updated'], 1)
+
+
+class ProductCatalogTests(TestCase):
+    """Тесты каталога товаров"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.shop_user = User.objects.create_user(email='catalog@example.com', password='testpass123', type='shop',
+                                                  is_active=True)
+        with open(SHOP1_YAML, 'rb') as file:
+            import_file(self.shop_user, file)
+        # версии каталога и страницы в кэше не откатываются вместе с базой
+        cache.clear()
+        # словари запоминают id после фиксации, а транзакция теста будет откачена
+        self.addCleanup(category_ids.clear)
+        self.addCleanup(parameter_ids.clear)
+
+    def test_cursor_pagination(self):
+        """Страницы идут по курсору без пропусков и повторов, глубокие страницы не дороже первой"""
+        url = f"{reverse('backend:products')}?page_size=5"
+        ids, query_counts = [], []
+        while url:
+            with AppQueries() as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            page = response.json()
+            self.assertLessEqual(len(page['results']), 5)
+            ids.extend(item['id'] for item in page['results'])
+            query_counts.append(len(queries.captured_queries))
+            url = page['next']
+
+        self.assertEqual(ids, sorted(ProductInfo.objects.values_list('id', flat=True)))
+        self.assertEqual(len(query_counts), 3)
+        self.assertEqual(len(set(query_counts)), 1)
+
+    def test_catalog_entries(self):
+        """Список товаров читается из витрины одним запросом и совпадает с данными каталога"""
+        product_infos = ProductInfo.objects.select_related('product__category').prefetch_related(
+            'product_parameters__parameter').order_by('id')
+        with AppQueries() as queries:
+            response = self.client.get(reverse('backend:products'), {'page_size': 200})
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(response.json()['results'], ProductInfoSerializer(product_infos, many=True).data)
+
+        # повторный импорт обновляет измененные позиции и убирает пропавшие
+        data = shop1_data()
+        removed = data['goods'].pop()
+        data['goods'][0]['price'] += 1
+        data['goods'][1]['parameters']['Цвет'] = 'фиолетовый'
+        with self.captureOnCommitCallbacks(execute=True):
+            import_data(self.shop_user, data)
+        response = self.client.get(reverse('backend:products'), {'page_size': 200})
+        self.assertEqual(response.json()['results'],
+                         ProductInfoSerializer(product_infos.filter(is_active=True), many=True).data)
+        self.assertFalse(CatalogEntry.objects.filter(product_info__external_id=removed['id']).exists())
+
+        # выключенный магазин пропадает из витрины и возвращается после включения
+        self.client.force_authenticate(self.shop_user)
+        for state, count in (('false', 0), ('true', len(data['goods']))):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('backend:partner-state'), {'state': state})
+            response = self.client.get(reverse('backend:products'), {'page_size': 200})
+            self.assertEqual(len(response.json()['results']), count)
+
+    def test_order_updates_stock(self):
+        """Оформление и отмена заказа сразу меняют остаток в витрине"""
+        buyer = User.objects.create_user(email='buyer@example.com', password='testpass123', is_active=True)
+        contact = Contact.objects.create(user=buyer, city='Москва', street='Тверская', phone='+79990000000')
+        product_info = ProductInfo.objects.filter(quantity__gt=1).order_by('id').first()
+        self.client.force_authenticate(buyer)
+        self.client.post(reverse('backend:basket'), {'items': [{'product_info': product_info.id,
+                                                                'quantity': product_info.quantity}]},
+                         format='json')
+        basket = Order.objects.get(user=buyer, state='basket')
+        params = {'shop_id': product_info.shop_id, 'page_size': 200}
+        in_stock = ProductInfo.objects.filter(quantity__gt=0).count()
+        etag = self.client.get(reverse('backend:products'), params)['ETag']
+
+        with patch('backend.views.new_order.send'), \
+                patch('backend.celery_tasks.send_order_confirmation_email.delay'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('backend:order'), {'id': basket.id, 'contact': contact.id},
+                                        format='json')
+        self.assertTrue(response.json()['Status'])
+        self.assertEqual(CatalogEntry.objects.get(product_info=product_info).quantity, 0)
+        # распроданная позиция пропадает из счетчиков в наличии
+        facets_url = reverse('backend:product-facets')
+
+        def parameter_counts(**params):
+            return {(parameter['name'], value['value']): value['count']
+                    for parameter in self.client.get(facets_url, params).json()['parameters']
+                    for value in parameter['values']}
+
+        self.assertEqual(self.client.get(facets_url, {'in_stock': 'true'}).json()['total'], in_stock - 1)
+        sold_out = {(parameter['parameter'], parameter['value']) for parameter in product_info.parameters}
+        self.assertTrue(sold_out)
+        self.assertEqual(parameter_counts(in_stock='true'),
+                         {key: count - (key in sold_out) for key, count in parameter_counts().items()
+                          if count - (key in sold_out)})
+        # распроданная позиция выпадает из сравнения цен
+        self.assertFalse(ProductPriceStats.objects.filter(best_offer=product_info).exists())
+        # закэшированная страница и ETag магазина устаревают вместе с остатком
+        response = self.client.get(reverse('backend:products'), params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn({'id': product_info.id, 'quantity': 0},
+                      [{'id': item['id'], 'quantity': item['quantity']} for item in response.json()['results']])
+
+        with patch('backend.celery_tasks.send_order_status_update_email.delay'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse('backend:order'), {'id': basket.id}, format='json')
+        self.assertTrue(response.json()['Status'])
+        self.assertEqual(CatalogEntry.objects.get(product_info=product_info).quantity, product_info.quantity)
+        self.assertEqual(self.client.get(facets_url, {'in_stock': 'true'}).json(),
+                         self.client.get(facets_url).json())
+        self.assertTrue(ProductPriceStats.objects.filter(best_offer=product_info).exists())
+
+    def test_admin_edits_refresh_catalog(self):
+        """Правка позиции и ее параметров вне импорта обновляет витрину, поиск, счетчики и цены"""
+        product_info = ProductInfo.objects.filter(quantity__gt=0).order_by('id').first()
+        color = product_info.product_parameters.get(parameter__name='Цвет')
+        etag = self.client.get(reverse('backend:products'))['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product_info.price, product_info.quantity = 1, 0
+            product_info.save()
+        entry = CatalogEntry.objects.get(product_info=product_info)
+        self.assertEqual((entry.price, entry.quantity), (1, 0))
+        self.assertFalse(ProductPriceStats.objects.filter(best_offer=product_info).exists())
+        self.assertEqual(self.client.get(reverse('backend:products'), HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            color.value = 'изумрудный'
+            color.save()
+        self.assertIn({'parameter': 'Цвет', 'value': 'изумрудный'},
+                      CatalogEntry.objects.get(product_info=product_info).parameters)
+        self.assertTrue(ProductFacet.objects.filter(parameter__name='Цвет', value='изумрудный', count=1,
+                                                    in_stock=0).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            color.delete()
+        self.assertNotIn('Цвет', [parameter['parameter'] for parameter in
+                                  CatalogEntry.objects.get(product_info=product_info).parameters])
+        self.assertFalse(ProductFacet.objects.filter(value='изумрудный').exists())
+
+        word = product_info.product.name.split()[0]
+        self.assertIn(product_info.id, search_products(word))
+        with self.captureOnCommitCallbacks(execute=True):
+            product_info.delete()
+        self.assertFalse(CatalogEntry.objects.filter(product_info_id=color.product_info_id).exists())
+        self.assertNotIn(color.product_info_id, search_products(word))
+
+    def test_parameter_documents(self):
+        """Импорт ведет ProductInfo.parameters, витрина собирается без обращения к ProductParameter"""
+        for product_info in ProductInfo.objects.prefetch_related('product_parameters__parameter'):
+            self.assertEqual(product_info.parameters, [
+                {'parameter': product_parameter.parameter.name, 'value': product_parameter.value}
+                for product_parameter in product_info.product_parameters.order_by('id')])
+
+        ids = list(ProductInfo.objects.values_list('id', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            refresh_catalog_entries(ids)
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'backend_productparameter' in query['sql']])
+
+        # неизмененные параметры не считаются изменением
+        with self.captureOnCommitCallbacks(execute=True):
+            result = import_data(self.shop_user, shop1_data())
+        self.assertEqual((result['updated'], result['unchanged']), (0, len(ids)))
+
+        expected = dict(ProductInfo.objects.values_list('id', 'parameters'))
+        ProductInfo.objects.update(parameters=[])
+        refresh_parameter_documents(ids)
+        self.assertEqual(dict(ProductInfo.objects.values_list('id', 'parameters')), expected)
+
+    def test_price_comparison(self):
+        """Сравнение цен берется из агрегатов, которые обновляют импорт и смена статуса магазина"""
+        data = shop1_data()
+        other = dict(data, shop='Другой магазин', goods=[
+            dict(item, price=item['price'] + (100 if number % 2 else -100), quantity=0 if number == 0 else 1)
+            for number, item in enumerate(data['goods'])])
+        other_user = User.objects.create_user(email='other@example.com', password='testpass123', type='shop',
+                                              is_active=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            import_data(other_user, other)
+
+        def expected(goods):
+            prices = {}
+            for item in goods:
+                if item['quantity'] > 0:
+                    prices.setdefault((item['name'], item['category']), []).append(item['price'])
+            return {key: (len(values), min(values), max(values), median(values)) for key, values in prices.items()}
+
+        def compared():
+            with AppQueries() as queries:
+                response = self.client.get(reverse('backend:product-prices'), {'page_size': 200})
+            self.assertEqual(len(queries.captured_queries), 1)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            results = response.json()['results']
+            for item in results:
+                self.assertEqual(item['best_offer']['price'], item['min_price'])
+            categories = dict(Category.objects.values_list('name', 'id'))
+            return {(item['name'], categories[item['category']]): (
+                item['offers'], item['min_price'], item['max_price'], item['median_price']) for item in results}
+
+        self.assertEqual(compared(), expected(data['goods'] + other['goods']))
+        cheaper = self.client.get(reverse('backend:product-prices'), {
+            'product_id': Product.objects.get(name=data['goods'][2]['name']).id}).json()['results']
+        self.assertEqual(cheaper[0]['best_offer']['shop']['name'], 'Другой магазин')
+
+        self.client.force_authenticate(other_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('backend:partner-state'), {'state': 'false'})
+        self.assertEqual(compared(), expected(data['goods']))
+        self.assertEqual(self.client.get(reverse('backend:product-prices'), {'product_id': 'x'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_page_cache(self):
+        """Повторный запрос страницы отдается из кэша, импорт и смена статуса магазина ее обновляют"""
+        shop = Shop.objects.get(user=self.shop_user)
+        url = reverse('backend:products')
+        first = self.client.get(url, {'shop_id': shop.id, 'page_size': 5})
+        with AppQueries() as queries:
+            second = self.client.get(url, {'shop_id': shop.id, 'page_size': 5})
+        self.assertEqual(queries.captured_queries, [])
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], 'application/json')
+
+        data = shop1_data()
+        data['goods'][0]['price'] = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            import_data(self.shop_user, data)
+        with AppQueries() as queries:
+            response = self.client.get(url, {'shop_id': shop.id, 'page_size': 5})
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(response.json()['results'][0]['price'], 1)
+
+        self.client.force_authenticate(self.shop_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('backend:partner-state'), {'state': 'false'})
+        self.assertEqual(self.client.get(url, {'page_size': 5}).json()['results'], [])
+
+        # ошибки фильтров не кэшируются
+        self.assertEqual(self.client.get(url, {'price_min': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'price_min': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_page_cache_shop_id_spelling(self):
+        """Любая запись shop_id зависит от версии магазина, неверная отклоняется"""
+        shop = Shop.objects.get(user=self.shop_user)
+        url = reverse('backend:products')
+        self.assertEqual(self.client.get(url, {'shop_id': f'0{shop.id}'}).json()['results'][0]['price'], 110000)
+
+        data = shop1_data()
+        data['goods'][0]['price'] = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            import_data(self.shop_user, data)
+        self.assertEqual(self.client.get(url, {'shop_id': f'0{shop.id}'}).json()['results'][0]['price'], 1)
+
+        for shop_id in (f'{shop.id}.0', 'x'):
+            response = self.client.get(url, {'shop_id': shop_id})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertNotIn('ETag', response)
+
+    def test_conditional_get(self):
+        """Неизмененные каталог, категории и магазины отдаются ответом 304 без запросов к базе"""
+        shop = Shop.objects.get(user=self.shop_user)
+        requests = ((reverse('backend:categories'), {}), (reverse('backend:shops'), {}),
+                    (reverse('backend:products'), {'shop_id': shop.id, 'page_size': 5}))
+        etags = {}
+        for url, params in requests:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            etags[url] = response['ETag']
+            with AppQueries() as queries:
+                response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(queries.captured_queries, [])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response['ETag'], etags[url])
+            self.assertEqual(response.content, b'')
+
+        # после импорта все ответы меняются
+        data = shop1_data()
+        data['goods'][0]['price'] = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            import_data(self.shop_user, data)
+        for url, params in requests:
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response['ETag'], etags[url])
+
+    def test_sparse_fields(self):
+        """fields и expand сокращают ответ и выбираемые колонки"""
+        url = reverse('backend:products')
+        with AppQueries() as queries:
+            response = self.client.get(url, {'fields': 'price,id,name,quantity', 'page_size': 200})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual(len(results), 14)
+        self.assertEqual(list(results[0]), ['id', 'name', 'quantity', 'price'])
+        product_info = ProductInfo.objects.select_related('product').get(id=results[0]['id'])
+        self.assertEqual(results[0], {'id': product_info.id, 'name': product_info.product.name,
+                                      'quantity': product_info.quantity, 'price': product_info.price})
+        self.assertNotIn('"parameters"', queries.captured_queries[0]['sql'])
+        self.assertEqual(self.client.get(url, {'compact': 'true', 'page_size': 200}).json()['results'], results)
+
+        response = self.client.get(url, {'fields': 'id,shop', 'expand': 'shop'})
+        shop = Shop.objects.get(user=self.shop_user)
+        self.assertEqual(response.json()['results'][0]['shop'], {'id': shop.id, 'name': shop.name})
+
+        response = self.client.get(reverse('backend:product-search'), {'q': 'apple', 'fields': 'id,category'})
+        self.assertEqual({tuple(item) for item in response.json()['results']}, {('id', 'category')})
+
+        for params in ({'fields': 'id,secret'}, {'expand': 'product'}):
+            self.assertEqual(self.client.get(url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(STREAM_BATCH_SIZE=4)
+    def test_streaming(self):
+        """Каталог отдается потоком целиком, со сжатием по Accept-Encoding"""
+        url = reverse('backend:products')
+        results = self.client.get(url, {'page_size': 200}).json()['results']
+
+        response = self.client.get(url, {'stream': 'true'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), results)
+
+        response = self.client.get(url, {'stream': 'true', 'fields': 'id,price'},
+                                   HTTP_ACCEPT_ENCODING='gzip;q=1.0, identity; q=0.5, *;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertEqual(json.loads(gzip.decompress(b''.join(response.streaming_content))),
+                         [{'id': item['id'], 'price': item['price']} for item in results])
+
+        response = self.client.get(url, {'stream': 'true'}, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_filters(self):
+        """Фильтры по ценам, наличию и параметрам считаются на сервере"""
+        goods = shop1_data()['goods']
+
+        def external_ids(params):
+            response = self.client.get(reverse('backend:products'), dict(params, page_size=200))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids = [item['id'] for item in response.json()['results']]
+            return set(ProductInfo.objects.filter(id__in=ids).values_list('external_id', flat=True))
+
+        self.assertEqual(external_ids({'price_min': 20000, 'price_max': 70000}),
+                         {item['id'] for item in goods if 20000 <= item['price'] <= 70000})
+        self.assertEqual(external_ids({'price_rrc_max': 10000, 'in_stock': 'true'}),
+                         {item['id'] for item in goods if item['price_rrc'] <= 10000 and item['quantity'] > 0})
+        self.assertEqual(external_ids({'param': 'Цвет=черный'}),
+                         {item['id'] for item in goods if item['parameters'].get('Цвет') == 'черный'})
+        self.assertEqual(external_ids({'param': ['Встроенная память (Гб)>=256', 'Цвет!=черный']}),
+                         {item['id'] for item in goods if item['parameters'].get('Встроенная память (Гб)', 0) >= 256
+                          and item['parameters'].get('Цвет') != 'черный'})
+        self.assertTrue(external_ids({'param': 'Встроенная память (Гб)>=256'}))
+        diagonal = 'Диагональ (дюйм)'
+        self.assertEqual(external_ids({'param': [f'{diagonal}>=6', f'{diagonal}<=6,5 дюйм']}),
+                         {item['id'] for item in goods if 6 <= item['parameters'].get(diagonal, 0) <= 6.5})
+        self.assertEqual(Parameter.objects.get(name=diagonal).unit, 'дюйм')
+        self.assertEqual([parse_number(value, 'Гб') for value in ('6.1', '256 Гб', '3840x2160', True, 'черный')],
+                         [6.1, 256, None, None, None])
+
+        for params in ({'price_min': 'дешево'}, {'param': 'Цвет'}, {'param': 'Цвет>черный'}):
+            response = self.client.get(reverse('backend:products'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_parameter_units(self):
+        """Значения в других единицах переводятся в единицу параметра, непереводимые в диапазоны не попадают"""
+        self.assertEqual([parse_number(value, 'Гб') for value in ('1 Тб', '512 ГБ', '2048 Мб', '256 дюйм', '8 Гб')],
+                         [1024, 512, 2, None, 8])
+        self.assertEqual([parse_number(value) for value in ('256', '256 Гб')], [256, None])
+
+        memory = 'Встроенная память (Гб)'
+        data = shop1_data()
+        data['shop'] = 'Другой магазин'
+        data['goods'][0]['parameters'][memory] = '1 Тб'
+        data['goods'][1]['parameters'][memory] = '64 попугая'
+        user = User.objects.create_user(email='units@example.com', password='testpass123', type='shop',
+                                        is_active=True)
+        import_data(user, data)
+        shop = Shop.objects.get(user=user)
+        numbers = dict(ProductParameter.objects.filter(
+            product_info__shop=shop, parameter__name=memory).values_list('product_info__external_id', 'value_number'))
+        self.assertEqual(numbers[data['goods'][0]['id']], 1024)
+        self.assertIsNone(numbers[data['goods'][1]['id']])
+
+        for value in ('1000', '1 Тб'):
+            response = self.client.get(reverse('backend:products'), {'shop_id': shop.id, 'param': f'{memory}>={value}'})
+            self.assertEqual([item['id'] for item in response.json()['results']],
+                             list(ProductInfo.objects.filter(shop=shop, external_id=data['goods'][0]['id']).values_list(
+                                 'id', flat=True)))
+        response = self.client.get(reverse('backend:products'), {'param': f'{memory}>=1 дюйм'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_facets(self):
+        """Счетчики фильтров из агрегатов совпадают с подсчетом по каталогу"""
+        goods = shop1_data()['goods']
+        url = reverse('backend:product-facets')
+
+        with AppQueries() as queries:
+            facets = self.client.get(url, {'category_id': 224}).json()
+        self.assertFalse([query for query in queries.captured_queries if 'backend_productparameter' in query['sql']])
+        smartphones = [item for item in goods if item['category'] == 224]
+        self.assertEqual(facets['total'], len(smartphones))
+        self.assertEqual([category['id'] for category in facets['categories']], [224])
+        colors, = [parameter['values'] for parameter in facets['parameters'] if parameter['name'] == 'Цвет']
+        self.assertEqual({color['value']: color['count'] for color in colors},
+                         {color: sum(item['parameters'].get('Цвет') == color for item in smartphones)
+                          for color in {item['parameters'].get('Цвет') for item in smartphones} - {None}})
+
+        in_stock = self.client.get(url, {'in_stock': 'true'}).json()
+        self.assertEqual(in_stock['total'], sum(item['quantity'] > 0 for item in goods))
+
+        # с фильтрами по ценам и параметрам счетчики считаются по отобранным позициям витрины
+        black = self.client.get(url, {'category_id': 224, 'param': 'Цвет=черный', 'price_max': 70000}).json()
+        matching = [item for item in smartphones if item['parameters'].get('Цвет') == 'черный'
+                    and item['price'] <= 70000]
+        self.assertEqual(black['total'], len(matching))
+        self.assertEqual(black['categories'], [{'id': 224, 'name': 'Смартфоны', 'count': len(matching)}])
+        memory, = [parameter['values'] for parameter in black['parameters']
+                   if parameter['name'] == 'Встроенная память (Гб)']
+        self.assertEqual({value['value']: value['count'] for value in memory},
+                         {str(value): sum(item['parameters'].get('Встроенная память (Гб)') == value
+                                          for item in matching)
+                          for value in {item['parameters'].get('Встроенная память (Гб)') for item in matching}})
+
+        for params in ({'category_id': 'x'}, {'price_min': 'дешево'}, {'param': 'Цвет'}):
+            self.assertEqual(self.client.get(url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+        # после импорта без части позиций счетчики пересчитываются
+        import_data(self.shop_user, {'shop': 'Связной', 'categories': [{'id': 224, 'name': 'Смартфоны'}],
+                                     'goods': smartphones[:1]})
+        self.assertEqual(self.client.get(url).json()['total'], 1)
+
+    def test_search(self):
+        """Поиск учитывает словоформы, ищет последнее слово по префиксу и следит за импортом"""
+        url = reverse('backend:product-search')
+
+        def names(query, **params):
+            response = self.client.get(url, dict(params, q=query))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [item['product']['name'] for item in response.json()['results']]
+
+        self.assertEqual(len(names('смартфонов apple')), 4)
+        self.assertEqual(names('красного iphone'), ['Смартфон Apple iPhone XR 256GB (красный)'])
+        self.assertEqual(names('samsung tv'), ['Samsung QLED Q90R 65" 4K UHD Smart TV'])
+        self.assertEqual(len(names('samsung smart')), 3)
+        page = self.client.get(url, {'q': 'smart', 'limit': 2}).json()
+        self.assertEqual((page['count'], len(page['results'])), (8, 2))
+        self.assertEqual(self.client.get(url, {'q': ' '}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        # позиции выключенного магазина отсеиваются до пагинации, страницы остаются полными
+        data = shop1_data()
+        other_user = User.objects.create_user(email='other@example.com', password='testpass123', type='shop',
+                                              is_active=True)
+        import_data(other_user, dict(data, shop='Другой магазин'))
+        Shop.objects.filter(user=other_user).update(state=False)
+        CatalogEntry.objects.filter(shop__user=other_user).update(shop_state=False)
+        for offset in range(0, 8, 2):
+            page = self.client.get(url, {'q': 'smart', 'limit': 2, 'offset': offset}).json()
+            self.assertEqual((page['count'], len(page['results'])), (8, 2))
+
+        # позиции, пропавшие из прайс-листа, больше не находятся
+        data = shop1_data()
+        data['goods'] = [item for item in data['goods'] if 'Apple' not in item['name']]
+        import_data(self.shop_user, data)
+        self.assertEqual(names('apple'), [])
+        self.assertEqual(len(names('samsung')), 3)
+
+    @override_settings(AUTOCOMPLETE_CHECK_INTERVAL=0)
+    @patch('backend.celery_tasks.rebuild_autocomplete_index.delay', side_effect=publish_index)
+    def test_autocomplete(self, mock_rebuild):
+        """Подсказки ищутся по началу любого слова и обновляются после импорта"""
+        url = reverse('backend:product-autocomplete')
+
+        def suggestions(query, **params):
+            response = self.client.get(url, dict(params, q=query))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [(item['text'], item['type']) for item in response.json()['suggestions']]
+
+        self.assertEqual(suggestions('смарт'), [
+            ('Смартфоны', 'category'),
+            ('Смартфон Apple iPhone XR 128GB (синий)', 'product'),
+            ('Смартфон Apple iPhone XR 256GB (черный)', 'product'),
+            ('Смартфон Apple iPhone XR 256GB (красный)', 'product'),
+            ('Смартфон Apple iPhone XS Max 512GB (золотистый)', 'product')])
+        self.assertIn(('apple/iphone/xr', 'model'), suggestions('XR'))
+        self.assertIn(('Смартфон Apple iPhone XR 256GB (красный)', 'product'), suggestions('iph', limit=50))
+        self.assertEqual(len(suggestions('iph', limit=2)), 2)
+        self.assertEqual(suggestions('с'), [])
+        self.assertEqual(self.client.get(url, {'q': 'iph', 'limit': 'x'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+        # после импорта без товаров Apple подсказки по ним пропадают
+        data = shop1_data()
+        data['goods'] = [item for item in data['goods'] if 'Apple' not in item['name']]
+        with self.captureOnCommitCallbacks(execute=True):
+            import_data(self.shop_user, data)
+        self.assertEqual(suggestions('apple'), [])
+        self.assertEqual(autocomplete.suggest('iphone'), [])
+
+    @override_settings(AUTOCOMPLETE_CHECK_INTERVAL=0)
+    @patch('backend.celery_tasks.rebuild_autocomplete_index.delay', side_effect=publish_index)
+    def test_autocomplete_rebuild_failure(self, mock_rebuild):
+        """Пока индекс не удается построить, подсказки идут по прежнему индексу или пустые"""
+        url = reverse('backend:product-autocomplete')
+        self.assertTrue(self.client.get(url, {'q': 'iph'}).json()['suggestions'])
+
+        # задача поставлена, но в воркере падает и индекс в кэше не меняется
+        with patch('backend.celery_tasks.rebuild_autocomplete_index.delay') as failed_rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_autocomplete_version()
+            for _ in range(2):
+                response = self.client.get(url, {'q': 'iph'})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertTrue(response.json()['suggestions'])
+            failed_rebuild.assert_called_once_with()
+
+            cache.clear()
+            self.assertEqual(Autocomplete().suggest('iph'), [])
+
+    @override_settings(AUTOCOMPLETE_CHECK_INTERVAL=0)
+    @patch('backend.celery_tasks.rebuild_autocomplete_index.delay', side_effect=publish_index)
+    def test_autocomplete_index_is_downloaded_once(self, mock_rebuild):
+        """Заказы не перестраивают подсказки, а индекс скачивается из кэша один раз на версию"""
+        completer = Autocomplete()
+        self.assertTrue(completer.suggest('iph'))
+        self.assertEqual(mock_rebuild.call_count, 1)
+
+        with patch('backend.autocomplete.cache', wraps=cache) as mock_cache:
+            # так версию каталога меняет каждый заказ
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_catalog_version()
+            for _ in range(3):
+                self.assertTrue(completer.suggest('iph'))
+            self.assertNotIn(call(INDEX_KEY), mock_cache.get.call_args_list)
+            self.assertEqual(mock_rebuild.call_count, 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                bump_autocomplete_version()
+            for _ in range(3):
+                self.assertTrue(completer.suggest('iph'))
+            self.assertEqual(mock_cache.get.call_args_list.count(call(INDEX_KEY)), 1)
+            self.assertEqual(mock_rebuild.call_count, 2)
+
+    def test_page_size_limit(self):
+        """Размер страницы ограничен max_page_size"""
+        response = self.client.get(reverse('backend:products'), {'page_size': 100000})
+        self.assertEqual(len(response.json()['results']), 14)
+        self.assertIsNone(response.json()['next'])
+
+
+class BenchmarkTests(TestCase):
+    """Тесты генератора прайс-листов и замеров импорта"""
+
+    def test_generated_price_list_is_importable(self):
+        """Сгенерированный прайс-лист разбирается и повторяется при том же seed"""
+        path = os.path.join(tempfile.mkdtemp(), 'generated.yaml')
+        call_command('generate_price_list', '1k', output=path, seed=7, stderr=StringIO())
+        with open(path, 'rb') as file:
+            first = file.read()
+        call_command('generate_price_list', '1000', output=path, seed=7, stderr=StringIO())
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), first)
+
+        with open(path, 'rb') as file:
+            data = load_price_list(file)
+            goods = list(data['goods'])
+        self.assertEqual(len(goods), 1000)
+        self.assertEqual(len({item['id'] for item in goods}), 1000)
+        self.assertLess(len({name for item in goods for name in item['parameters']}), 20)
+        self.assertEqual(goods[0].keys(), {'id', 'category', 'model', 'name', 'price', 'price_rrc', 'quantity',
+                                           'parameters'})
+
+    def test_serialization_benchmark(self):
+        """Замер сериализации сравнивает ответы побайтно и не оставляет данных"""
+        out = StringIO()
+        call_command('benchmark_serialization', '100', repeat=1, stdout=out)
+        self.assertEqual([line.split()[:2] for line in out.getvalue().splitlines()],
+                         [['catalog', '100'], ['orders', '100']])
+        self.assertFalse(User.objects.filter(email__startswith='benchmark-').exists())
+
+    def test_benchmark_reports_metrics(self):
+        """Замер сохраняет метрики и находит регрессии относительно baseline"""
+        directory = tempfile.mkdtemp()
+        results_path = os.path.join(directory, 'results.json')
+        call_command('benchmark_import', '200', json=results_path, stdout=StringIO())
+
+        with open(results_path) as file:
+            results = json.load(file)
+        self.assertEqual([(item['size'], item['scenario']) for item in results], [(200, 'initial'), (200, 'repeat')])
+        self.assertEqual(results[0]['rows'], 200)
+        self.assertGreater(results[0]['queries'], 0)
+        self.assertGreater(results[0]['peak_rss_mb'], 0)
+        self.assertFalse(User.objects.filter(email__startswith='benchmark-').exists())
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {SEARCH_TABLE}')
+            self.assertEqual(cursor.fetchone(), (0,))
+
+        baseline_path = os.path.join(directory, 'baseline.json')
+        with open(baseline_path, 'w') as file:
+            json.dump([dict(item, queries=1) for item in results], file)
+        with self.assertRaises(CommandError):
+            call_command('benchmark_import', '200', baseline=baseline_path, stdout=StringIO())
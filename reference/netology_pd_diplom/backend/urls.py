@@ -3,12 +3,15 @@ from django_rest_passwordreset.views import reset_password_request_token, reset_
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
 from .views import PartnerUpdate, RegisterAccount, LoginAccount, CategoryView, ShopView, ProductInfoView, \
-    BasketView, AccountDetails, ContactView, OrderView, PartnerState, PartnerOrders, ConfirmAccount
+    BasketView, AccountDetails, ContactView, OrderView, PartnerState, PartnerOrders, ConfirmAccount, \
+    PartnerImportStatus, ProductFacetsView, ProductSearchView, \
+    ProductAutocompleteView, ProductPricesView
 
 app_name = 'backend'
 urlpatterns = [
     # Основные API endpoints
     path('partner/update', PartnerUpdate.as_view(), name='partner-update'),
+    path('partner/import/<str:task_id>', PartnerImportStatus.as_view(), name='partner-import-status'),
     path('partner/state', PartnerState.as_view(), name='partner-state'),
     path('partner/orders', PartnerOrders.as_view(), name='partner-orders'),
     path('user/register', RegisterAccount.as_view(), name='user-register'),
@@ -21,6 +24,10 @@ urlpatterns = [
     path('categories', CategoryView.as_view(), name='categories'),
     path('shops', ShopView.as_view(), name='shops'),
     path('products', ProductInfoView.as_view(), name='products'),
+    path('products/facets', ProductFacetsView.as_view(), name='product-facets'),
+    path('products/search', ProductSearchView.as_view(), name='product-search'),
+    path('products/autocomplete', ProductAutocompleteView.as_view(), name='product-autocomplete'),
+    path('products/prices', ProductPricesView.as_view(), name='product-prices'),
     path('basket', BasketView.as_view(), name='basket'),
     path('order', OrderView.as_view(), name='order'),
 
@@ -1,28 +1,46 @@
 from rest_framework.request import Request
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
 from django.db import IntegrityError
 from django.db.models import Q, Sum, F
-from django.http import JsonResponse
-from requests import get
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 from rest_framework.authtoken.models import Token
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 from ujson import loads as load_json
-from yaml import load as load_yaml, Loader
 from django.db import transaction
 from drf_spectacular.utils import extend_schema
 
+from .autocomplete import autocomplete, bump_autocomplete_version
+from .catalog import bulk_catalog_update, bump_catalog_version, catalog_etag, catalog_page_etag, catalog_page_key, \
+    refresh_stock
 from .celery_tasks import async_partner_update
-
-from .models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter, Order, OrderItem, \
-    Contact, ConfirmEmailToken, User
-from .serializers import UserSerializer, CategorySerializer, ShopSerializer, ProductInfoSerializer, \
-    OrderItemSerializer, OrderSerializer, ContactSerializer
+from .importer import import_file, import_from_url
+from .price_list import spool_price_list
+from .facets import facet_counts
+from .filters import filter_products
+from .pagination import ProductCursorPagination, SearchPagination
+from .prices import refresh_price_stats, shop_product_ids
+from .progress import ImportProgress
+from .search import search_products
+from .streaming import iterate_batches, queryset_batches, stream_batch_size, stream_requested, \
+    streaming_json_response
+
+from .models import Shop, Category, ProductInfo, Order, OrderItem, Contact, ConfirmEmailToken, User, \
+    CatalogEntry, ProductPriceStats
+from .renderers import UJSONRenderer
+from .serializers import UserSerializer, CategorySerializer, ShopSerializer, OrderItemSerializer, ContactSerializer, \
+    ProductPriceStatsSerializer, catalog_fieldset, serialize_catalog_entries, serialize_orders
 from .signals import new_user_registered, new_order
 
 
@@ -216,6 +234,7 @@ class LoginAccount(APIView):
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
 
 
+@method_decorator([vary_on_headers('Accept'), condition(etag_func=catalog_etag)], name='get')
 class CategoryView(ListAPIView):
     """
     Класс для просмотра категорий
@@ -224,6 +243,7 @@ class CategoryView(ListAPIView):
     serializer_class = CategorySerializer
 
 
+@method_decorator([vary_on_headers('Accept'), condition(etag_func=catalog_etag)], name='get')
 class ShopView(ListAPIView):
     """
     Класс для просмотра списка магазинов
@@ -232,6 +252,7 @@ class ShopView(ListAPIView):
     serializer_class = ShopSerializer
 
 
+@method_decorator([vary_on_headers('Accept'), condition(etag_func=catalog_page_etag)], name='get')
 class ProductInfoView(APIView):
     """
         A class for searching products.
@@ -247,31 +268,206 @@ class ProductInfoView(APIView):
         """
                Retrieve the product information based on the specified filters.
 
+               The fields and expand query parameters limit the response to the requested fields.
+               With stream=true the whole filtered catalog is streamed as a JSON array without pagination.
+
                Args:
                - request (Request): The Django request object.
 
                Returns:
-               - Response: The response containing the product information.
+               - Response: One page of the product information with cursor links to the next and previous pages.
                """
-        query = Q(shop__state=True)
-        shop_id = request.query_params.get('shop_id')
-        category_id = request.query_params.get('category_id')
+        if stream_requested(request):
+            return self.stream(request)
 
-        if shop_id:
-            query = query & Q(shop_id=shop_id)
+        # готовый JSON страницы берется из кэша без запросов к базе и сериализации;
+        # браузерный API всегда рендерится заново
+        cacheable = request.accepted_renderer.format == 'json'
+        if cacheable:
+            try:
+                key = catalog_page_key(request)
+            except ValueError as error:
+                return JsonResponse({'Status': False, 'Errors': str(error)}, status=400)
+            content = cache.get(key)
+            if content is not None:
+                return HttpResponse(content, content_type='application/json')
+
+        # витрина содержит только активные позиции, а параметры фильтруются подзапросами,
+        # поэтому запрос идет по одной таблице без join и distinct
+        queryset = CatalogEntry.objects.filter(shop_state=True)
+        try:
+            queryset = filter_products(queryset, request.query_params, category_field='category_id')
+            fields, expand, columns = catalog_fieldset(request.query_params)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Errors': str(error)}, status=400)
+
+        # выбираются только колонки запрошенных полей
+        paginator = ProductCursorPagination()
+        page = paginator.paginate_queryset(queryset.values(*columns), request, view=self)
+        response = paginator.get_paginated_response(serialize_catalog_entries(page, fields, expand))
+        if not cacheable:
+            return response
+
+        content = UJSONRenderer().render(response.data)
+        cache.set(key, content, getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 60 * 60))
+        return HttpResponse(content, content_type='application/json')
+
+    def stream(self, request):
+        """
+        Весь каталог по фильтрам одним потоковым JSON-массивом
 
-        if category_id:
-            query = query & Q(product__category_id=category_id)
+        Строки читаются курсором и кодируются пачками по STREAM_BATCH_SIZE, в кэш страниц не попадают.
+        """
+        queryset = CatalogEntry.objects.filter(shop_state=True)
+        try:
+            queryset = filter_products(queryset, request.query_params, category_field='category_id')
+            fields, expand, columns = catalog_fieldset(request.query_params)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Errors': str(error)}, status=400)
+
+        size = stream_batch_size()
+        rows = queryset.order_by('pk').values(*columns).iterator(chunk_size=size)
+        response = streaming_json_response(request, (
+            serialize_catalog_entries(batch, fields, expand) for batch in iterate_batches(rows, size)))
+        if response.has_header('Content-Encoding'):
+            # сжатый ответ не совпадает побайтно с несжатым, поэтому ETag слабый
+            response['ETag'] = 'W/' + quote_etag(catalog_page_etag(request))
+        return response
+
+
+@method_decorator([vary_on_headers('Accept'), condition(etag_func=catalog_etag)], name='get')
+class ProductPricesView(ListAPIView):
+    """
+    Класс для сравнения цен на товар в разных магазинах
 
-        # фильтруем и отбрасываем дуликаты
-        queryset = ProductInfo.objects.filter(
-            query).select_related(
-            'shop', 'product__category').prefetch_related(
-            'product_parameters__parameter').distinct()
+    Отдает минимальную, максимальную и медианную цену и лучшее предложение по каждому
+    товару среди активных магазинов, у которых он есть в наличии. Читается из ProductPriceStats.
+    Фильтры: category_id, product_id (можно несколько через запятую).
+    """
+    serializer_class = ProductPriceStatsSerializer
+    pagination_class = ProductCursorPagination
+
+    def get_queryset(self):
+        queryset = ProductPriceStats.objects.select_related('product__category', 'best_offer__shop')
+        if self.request.query_params.get('category_id'):
+            queryset = queryset.filter(product__category_id=self.request.query_params['category_id'])
+        if self.request.query_params.get('product_id'):
+            queryset = queryset.filter(product_id__in=self.request.query_params['product_id'].split(','))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        try:
+            return super().list(request, *args, **kwargs)
+        except ValueError:
+            return JsonResponse({'Status': False, 'Errors': 'category_id и product_id должны быть целыми числами'},
+                                status=400)
 
-        serializer = ProductInfoSerializer(queryset, many=True)
 
-        return Response(serializer.data)
+class ProductFacetsView(APIView):
+    """
+    A class for counting products by filter values.
+
+    Methods:
+    - get: Retrieve the facet counts for the filtered catalog.
+
+    Attributes:
+    - None
+    """
+
+    def get(self, request: Request, *args, **kwargs):
+        """
+        Retrieve the number of products per category, shop and parameter value.
+
+        Accepts the shop_id, category_id and in_stock filters of ProductInfoView. The counts are read from
+        the aggregates maintained at import time, so price and parameter filters are rejected.
+
+        Args:
+        - request (Request): The Django request object.
+
+        Returns:
+        - JsonResponse: The total and the counts for every facet value.
+        """
+        try:
+            counts = facet_counts(request.query_params)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Errors': str(error)}, status=400)
+
+        return JsonResponse({'Status': True, **counts})
+
+
+class ProductSearchView(APIView):
+    """
+    A class for full-text product search.
+
+    Methods:
+    - get: Retrieve the products matching the search query.
+
+    Attributes:
+    - None
+    """
+
+    def get(self, request: Request, *args, **kwargs):
+        """
+        Retrieve the products whose name or model match the query, most relevant first.
+
+        Args:
+        - request (Request): The Django request object.
+
+        Returns:
+        - Response: One page of the product information with limit/offset links.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return JsonResponse({'Status': False, 'Errors': 'Не указан поисковый запрос'}, status=400)
+        try:
+            fields, expand, columns = catalog_fieldset(request.query_params)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Errors': str(error)}, status=400)
+
+        # позиции выключенных магазинов отсеиваются до пагинации, иначе страницы выходят неполными
+        found = search_products(query)
+        visible = set(CatalogEntry.objects.filter(shop_state=True, pk__in=found).values_list('pk', flat=True))
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset([product_id for product_id in found if product_id in visible], request,
+                                           view=self)
+        products = {row['pk']: row for row in CatalogEntry.objects.filter(pk__in=page).values(*columns)}
+
+        return paginator.get_paginated_response(serialize_catalog_entries(
+            [products[product_id] for product_id in page if product_id in products], fields, expand))
+
+
+class ProductAutocompleteView(APIView):
+    """
+    A class for search-as-you-type suggestions.
+
+    Methods:
+    - get: Retrieve the suggestions for the typed prefix.
+
+    Attributes:
+    - None
+    """
+
+    def get(self, request: Request, *args, **kwargs):
+        """
+        Retrieve category, product and model suggestions starting with the typed prefix.
+
+        Args:
+        - request (Request): The Django request object.
+
+        Returns:
+        - JsonResponse: Up to `limit` suggestions (10 by default, 50 at most).
+        """
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            return JsonResponse({'Status': False, 'Errors': 'limit должен быть целым числом'}, status=400)
+
+        # по одной-двум буквам подсказывать нечего
+        if len(query) < getattr(settings, 'AUTOCOMPLETE_MIN_LENGTH', 2):
+            return JsonResponse({'Status': True, 'suggestions': []})
+
+        return JsonResponse({'Status': True, 'suggestions': autocomplete.suggest(query, limit)})
 
 
 class BasketView(APIView):
@@ -304,9 +500,7 @@ class BasketView(APIView):
 
         try:
             basket = Order.objects.filter(
-                user_id=request.user.id, state='basket').prefetch_related(
-                'ordered_items__product_info__product__category',
-                'ordered_items__product_info__product_parameters__parameter').annotate(
+                user_id=request.user.id, state='basket').annotate(
                 total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
 
             # Если корзина не существует, создаем пустую
@@ -319,15 +513,14 @@ class BasketView(APIView):
                 }
                 return Response(empty_basket)
 
-            serializer = OrderSerializer(basket, many=True)
+            baskets = serialize_orders(basket)
 
-            # Добавляем проверку доступности товаров
-            basket_data = serializer.data[0] if serializer.data else {}
+            # Добавляем проверку доступности товаров: остаток уже есть в данных позиции
+            basket_data = baskets[0] if baskets else {}
             if basket_data.get('ordered_items'):
                 for item in basket_data['ordered_items']:
-                    product_info = ProductInfo.objects.get(id=item['product_info'])
-                    item['available_quantity'] = product_info.quantity
-                    item['is_available'] = item['quantity'] <= product_info.quantity
+                    item['available_quantity'] = item['product_info']['quantity']
+                    item['is_available'] = item['quantity'] <= item['product_info']['quantity']
 
             return Response(basket_data)
 
@@ -382,7 +575,7 @@ class BasketView(APIView):
                         quantity = order_item.get('quantity', 1)
 
                         try:
-                            product_info = ProductInfo.objects.get(id=product_info_id)
+                            product_info = ProductInfo.objects.get(id=product_info_id, is_active=True)
                             if quantity > product_info.quantity:
                                 errors.append(
                                     f'Недостаточно товара "{product_info.product.name}". Доступно: {product_info.quantity}')
@@ -616,20 +809,20 @@ class PartnerUpdate(APIView):
                     return JsonResponse({'Status': False, 'Error': 'Wrong file format. Only YAML files are supported'},
                                         status=400)
 
-                yaml_data = file.read().decode('utf-8')
-
                 if async_mode:
-                    # Асинхронная обработка файла
+                    # Асинхронная обработка файла: в задачу передаем только имя сохраненного файла
+                    file_name = spool_price_list(file)
                     from .celery_tasks import async_partner_update
-                    task = async_partner_update.delay(request.user.id, yaml_data, None)
+                    task = async_partner_update.delay(request.user.id, file_name, None)
+                    ImportProgress(task.id).queue(request.user.id)
                     return JsonResponse({
                         'Status': True,
                         'Message': 'Import started in background',
                         'task_id': task.id
                     }, status=202)
                 else:
-                    # Синхронная обработка файла
-                    return self.sync_import_from_data(request.user, yaml_data)
+                    # Синхронная обработка файла: разбираем поток без чтения в память целиком
+                    return self.sync_import_from_data(request.user, file)
 
             elif url:
                 # Обработка URL
@@ -643,6 +836,7 @@ class PartnerUpdate(APIView):
                     # Асинхронная обработка URL
                     from .celery_tasks import async_partner_update
                     task = async_partner_update.delay(request.user.id, None, url)
+                    ImportProgress(task.id).queue(request.user.id)
                     return JsonResponse({
                         'Status': True,
                         'Message': 'Import started in background',
@@ -657,87 +851,67 @@ class PartnerUpdate(APIView):
 
     def sync_import_from_url(self, user, url):
         """
-        Синхронный импорт из URL (сохраняем существующую логику)
+        Синхронный импорт из URL
         """
-        stream = get(url).content
-        data = load_yaml(stream, Loader=Loader)
+        result = import_from_url(user, url)
+        if result.get('feed_unchanged'):
+            return JsonResponse({'Status': True, 'Message': 'Price list is unchanged', 'Details': result})
 
-        shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=user.id)
+        return JsonResponse({
+            'Status': True,
+            'Message': 'Import from URL completed successfully',
+            'Details': result
+        })
 
-        # Импорт категорий
-        for category in data['categories']:
-            category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-            category_object.shops.add(shop.id)
-            category_object.save()
+    def sync_import_from_data(self, user, file):
+        """
+        Синхронный импорт из загруженного файла
+        """
+        result = import_file(user, file)
+        if result.get('feed_unchanged'):
+            return JsonResponse({'Status': True, 'Message': 'Price list is unchanged', 'Details': result})
 
-        # Удаляем старые товары и импортируем новые
-        ProductInfo.objects.filter(shop_id=shop.id).delete()
+        return JsonResponse({
+            'Status': True,
+            'Message': 'Import from file completed successfully',
+            'Details': result
+        })
 
-        for item in data['goods']:
-            product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
 
-            product_info = ProductInfo.objects.create(product_id=product.id,
-                                                      external_id=item['id'],
-                                                      model=item['model'],
-                                                      price=item['price'],
-                                                      price_rrc=item['price_rrc'],
-                                                      quantity=item['quantity'],
-                                                      shop_id=shop.id)
+class PartnerImportStatus(APIView):
+    """
+    A class for tracking a background price list import.
 
-            # Импорт параметров
-            for name, value in item['parameters'].items():
-                parameter_object, _ = Parameter.objects.get_or_create(name=name)
-                ProductParameter.objects.create(product_info_id=product_info.id,
-                                                parameter_id=parameter_object.id,
-                                                value=value)
+    Methods:
+    - get: Retrieve the progress of the import task.
 
-        return JsonResponse({'Status': True, 'Message': 'Import from URL completed successfully'})
+    Attributes:
+    - None
+    """
 
-    def sync_import_from_data(self, user, yaml_data):
+    def get(self, request, task_id, *args, **kwargs):
         """
-        Синхронный импорт из YAML данных
+        Retrieve the progress of the import task started by PartnerUpdate.
+
+        Args:
+        - request (Request): The Django request object.
+        - task_id (str): The id returned by PartnerUpdate in async mode.
+
+        Returns:
+        - JsonResponse: The phase, processed/total rows, speed, ETA and the final result.
         """
-        data = load_yaml(yaml_data, Loader=Loader)
-
-        shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=user.id)
-
-        # Импорт категорий
-        for category in data['categories']:
-            category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-            category_object.shops.add(shop.id)
-            category_object.save()
-
-        # Удаляем старые товары и импортируем новые
-        ProductInfo.objects.filter(shop_id=shop.id).delete()
-
-        imported_count = 0
-        for item in data['goods']:
-            product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
-
-            product_info = ProductInfo.objects.create(product_id=product.id,
-                                                      external_id=item['id'],
-                                                      model=item['model'],
-                                                      price=item['price'],
-                                                      price_rrc=item['price_rrc'],
-                                                      quantity=item['quantity'],
-                                                      shop_id=shop.id)
-            imported_count += 1
-
-            # Импорт параметров
-            for name, value in item['parameters'].items():
-                parameter_object, _ = Parameter.objects.get_or_create(name=name)
-                ProductParameter.objects.create(product_info_id=product_info.id,
-                                                parameter_id=parameter_object.id,
-                                                value=value)
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
 
-        return JsonResponse({
-            'Status': True,
-            'Message': 'Import from file completed successfully',
-            'Details': {
-                'products_imported': imported_count,
-                'categories_processed': len(data['categories'])
-            }
-        })
+        if request.user.type != 'shop':
+            return JsonResponse({'Status': False, 'Error': 'Только для магазинов'}, status=403)
+
+        progress = ImportProgress(task_id).get()
+        # чужие задачи не отличаем от несуществующих
+        if progress is None or progress.pop('user_id') != request.user.id:
+            return JsonResponse({'Status': False, 'Error': 'Задача не найдена'}, status=404)
+
+        return JsonResponse({'Status': True, 'task_id': task_id, **progress})
 
 
 class PartnerState(APIView):
@@ -790,7 +964,14 @@ class PartnerState(APIView):
         state = request.data.get('state')
         if state:
             try:
-                Shop.objects.filter(user_id=request.user.id).update(state=str_to_bool(state))
+                state = str_to_bool(state)
+                with transaction.atomic():
+                    Shop.objects.filter(user_id=request.user.id).update(state=state)
+                    CatalogEntry.objects.filter(shop__user_id=request.user.id).update(shop_state=state)
+                    shop_ids = list(Shop.objects.filter(user_id=request.user.id).values_list('id', flat=True))
+                    refresh_price_stats(shop_product_ids(shop_ids))
+                    bump_catalog_version(*shop_ids)
+                    bump_autocomplete_version()
                 return JsonResponse({'Status': True})
             except ValueError as error:
                 return JsonResponse({'Status': False, 'Errors': str(error)})
@@ -812,6 +993,8 @@ class PartnerOrders(APIView):
         """
                Retrieve the orders associated with the authenticated partner.
 
+               With stream=true the orders are streamed in batches instead of being built in memory at once.
+
                Args:
                - request (Request): The Django request object.
 
@@ -825,13 +1008,13 @@ class PartnerOrders(APIView):
             return JsonResponse({'Status': False, 'Error': 'Только для магазинов'}, status=403)
 
         order = Order.objects.filter(
-            ordered_items__product_info__shop__user_id=request.user.id).exclude(state='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').select_related('contact').annotate(
+            ordered_items__product_info__shop__user_id=request.user.id).exclude(state='basket').annotate(
             total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
 
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        if stream_requested(request):
+            return streaming_json_response(request, queryset_batches(order, serialize_orders, stream_batch_size()))
+
+        return Response(serialize_orders(order))
 
 
 class ContactView(APIView):
@@ -934,6 +1117,8 @@ class OrderView(APIView):
         """
         Retrieve the details of user orders.
 
+        With stream=true the orders are streamed in batches instead of being built in memory at once.
+
         Args:
         - request (Request): The Django request object.
 
@@ -945,55 +1130,50 @@ class OrderView(APIView):
 
         try:
             orders = Order.objects.filter(
-                user_id=request.user.id).exclude(state='basket').prefetch_related(
-                'ordered_items__product_info__product__category',
-                'ordered_items__product_info__product_parameters__parameter').select_related('contact').annotate(
+                user_id=request.user.id).exclude(state='basket').annotate(
                 total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
 
+            if stream_requested(request):
+                return streaming_json_response(request, queryset_batches(
+                    orders, self._serialize_orders, stream_batch_size()), prefix=b'{"Status":true,"Orders":',
+                    suffix=b'}')
+
             # Если заказов нет, возвращаем пустой список
             if not orders.exists():
                 return JsonResponse({'Status': True, 'Orders': []})
 
-            serializer = OrderSerializer(orders, many=True)
-
-            # Добавляем дополнительную информацию о заказах
-            orders_data = []
-            for order_data in serializer.data:
-                # Добавляем информацию о контакте
-                if order_data.get('contact'):
-                    try:
-                        contact = Contact.objects.get(id=order_data['contact'])
-                        order_data['contact_details'] = {
-                            'id': contact.id,
-                            'phone': contact.phone,
-                            'city': contact.city,
-                            'street': contact.street,
-                            'house': contact.house,
-                            'apartment': contact.apartment
-                        }
-                    except Contact.DoesNotExist:
-                        order_data['contact_details'] = None
-
-                # Добавляем детальную информацию о товарах
-                if order_data.get('ordered_items'):
-                    for item in order_data['ordered_items']:
-                        try:
-                            product_info = ProductInfo.objects.get(id=item['product_info'])
-                            item['product_name'] = product_info.product.name
-                            item['shop_name'] = product_info.shop.name
-                            item['price'] = product_info.price
-                            item['total_price'] = item['quantity'] * product_info.price
-                        except ProductInfo.DoesNotExist:
-                            item['product_name'] = 'Товар не найден'
-                            item['shop_name'] = 'Магазин не найден'
-
-                orders_data.append(order_data)
-
-            return JsonResponse({'Status': True, 'Orders': orders_data})
+            return JsonResponse({'Status': True, 'Orders': self._serialize_orders(orders)})
 
         except Exception as e:
             return JsonResponse({'Status': False, 'Error': str(e)}, status=400)
 
+    @staticmethod
+    def _serialize_orders(orders):
+        """
+        Заказы с контактом, названиями товаров и магазинов и суммами по позициям
+        """
+        orders_data = serialize_orders(orders)
+        shop_names = dict(Shop.objects.filter(id__in={
+            item['product_info']['shop'] for order_data in orders_data
+            for item in order_data['ordered_items']}).values_list('id', 'name'))
+
+        # Добавляем дополнительную информацию о заказах
+        for order_data in orders_data:
+            # Добавляем информацию о контакте
+            contact = order_data['contact']
+            if contact:
+                order_data['contact_details'] = {field: contact[field] for field in
+                                                 ('id', 'phone', 'city', 'street', 'house', 'apartment')}
+
+            # Добавляем детальную информацию о товарах
+            for item in order_data['ordered_items']:
+                product_info = item['product_info']
+                item['product_name'] = product_info['product']['name']
+                item['shop_name'] = shop_names[product_info['shop']]
+                item['price'] = product_info['price']
+                item['total_price'] = item['quantity'] * product_info['price']
+        return orders_data
+
     # разместить заказ из корзины
     def post(self, request, *args, **kwargs):
         """
@@ -1051,9 +1231,14 @@ class OrderView(APIView):
                             }, status=400)
 
                         # Обновляем количество товаров на складе
-                        for item in basket.ordered_items.all():
-                            item.product_info.quantity -= item.quantity
-                            item.product_info.save()
+                        product_infos = []
+                        # витрину, цены и счетчики пересчитывает refresh_stock сразу для всех позиций
+                        with bulk_catalog_update():
+                            for item in basket.ordered_items.all():
+                                item.product_info.quantity -= item.quantity
+                                item.product_info.save()
+                                product_infos.append(item.product_info)
+                        refresh_stock(product_infos)
 
                         # Подтверждаем заказ
                         basket.contact = contact
@@ -1132,9 +1317,14 @@ class OrderView(APIView):
                         }, status=400)
 
                     # Обновляем количество товаров
-                    for item in basket.ordered_items.all():
-                        item.product_info.quantity -= item.quantity
-                        item.product_info.save()
+                    product_infos = []
+                    # витрину, цены и счетчики пересчитывает refresh_stock сразу для всех позиций
+                    with bulk_catalog_update():
+                        for item in basket.ordered_items.all():
+                            item.product_info.quantity -= item.quantity
+                            item.product_info.save()
+                            product_infos.append(item.product_info)
+                    refresh_stock(product_infos)
 
                     # Подтверждаем заказ
                     basket.contact = contact
@@ -1242,9 +1432,14 @@ class OrderView(APIView):
                 )
 
                 # Возвращаем товары на склад
-                for item in order.ordered_items.all():
-                    item.product_info.quantity += item.quantity
-                    item.product_info.save()
+                product_infos = []
+                # витрину, цены и счетчики пересчитывает refresh_stock сразу для всех позиций
+                with bulk_catalog_update():
+                    for item in order.ordered_items.all():
+                        item.product_info.quantity += item.quantity
+                        item.product_info.save()
+                        product_infos.append(item.product_info)
+                refresh_stock(product_infos)
 
                 # Отменяем заказ
                 order.state = 'canceled'
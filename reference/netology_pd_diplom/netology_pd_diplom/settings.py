@@ -151,13 +151,34 @@ CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60
 
+# Импорт прайс-листов
+IMPORT_BATCH_SIZE = 1000  # строк ProductInfo в одной пачке bulk_create
+IMPORT_CHUNK_SIZE = 10000  # позиций прайс-листа в одной задаче параллельного импорта
+# Каталог для загруженных прайс-листов, должен быть доступен и веб-процессу, и воркерам Celery
+PRICE_LIST_ROOT = os.path.join(BASE_DIR, 'price_lists')
+PRICE_LIST_MAX_SIZE = 100 * 1024 * 1024  # байт, для прайс-листов по URL
+PRICE_LIST_FETCH_TIMEOUT = 30  # секунд
+IMPORT_PROGRESS_TIMEOUT = 24 * 60 * 60  # сколько хранить прогресс фонового импорта в кэше, секунд
+
+# Поиск по каталогу: сколько самых релевантных результатов отдается постранично
+SEARCH_MAX_RESULTS = 1000
+# Подсказки: с какой длины запроса подсказывать и как часто проверять, не сменилась ли версия каталога (секунд)
+AUTOCOMPLETE_MIN_LENGTH = 2
+AUTOCOMPLETE_CHECK_INTERVAL = 1
+# Время жизни готовых страниц каталога в кэше (секунд); при импорте и смене статуса магазина
+# страницы устаревают сразу за счет смены версии в ключе
+CATALOG_PAGE_CACHE_TIMEOUT = 60 * 60
+# Сколько строк кодируется и сжимается за раз в потоковых ответах (?stream=true)
+STREAM_BATCH_SIZE = 500
+
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 40,
 
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        # тот же JSON, что у rest_framework.renderers.JSONRenderer, но через ujson
+        'backend.renderers.UJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 